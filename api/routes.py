@@ -2,17 +2,40 @@
 API路由定义
 """
 
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, Response, request, jsonify, session
 from functools import wraps
 import os
 from services.indicator_service import IndicatorService
 from services.backtest_service import BacktestService
 from config import DATA_DIR
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 取决于运行环境
+    orjson = None
+
 # 创建蓝图
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 
+def json_response(data, status: int = 200):
+    """
+    返回JSON响应
+    
+    安装orjson时直接编码为bytes（在C中遍历结果，支持numpy数组和标量），否则退化为jsonify
+    
+    Args:
+        data: 可JSON序列化的结果
+        status: HTTP状态码
+    """
+    if orjson is None:
+        response = jsonify(data)
+        response.status_code = status
+        return response
+    return Response(orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY), status=status,
+                    mimetype='application/json')
+
+
 # API登录验证装饰器
 def api_login_required(f):
     """API登录验证装饰器（返回JSON错误）"""
@@ -114,10 +137,10 @@ def calculate():
         
         # 如果计算失败，返回错误
         if not result.get('success', False):
-            return jsonify(result), 500
+            return json_response(result, 500)
         
         # 返回成功结果
-        return jsonify(result), 200
+        return json_response(result, 200)
         
     except Exception as e:
         return jsonify({
@@ -352,10 +375,10 @@ def backtest():
         
         # 如果计算失败，返回错误
         if not result.get('success', False):
-            return jsonify(result), 500
+            return json_response(result, 500)
         
         # 返回成功结果
-        return jsonify(result), 200
+        return json_response(result, 200)
         
     except Exception as e:
         return jsonify({
@@ -5,16 +5,24 @@
 from models.indicator import StockIndicator
 from utils.data_loader import load_stock_data
 from utils.period_converter import convert_to_period
+import importlib.util
 import pandas as pd
 import sys
 
+# 是否安装了pyarrow（保存Parquet格式结果需要）
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
 
-def main(period: str = 'D'):
+# 结果保存格式对应的命令行参数
+OUTPUT_FORMAT_FLAGS = {'--parquet': 'parquet', '--xlsx': 'xlsx'}
+
+
+def main(period: str = 'D', output_format: str = None):
     """
     主函数
     
     Args:
         period: 周期类型，'D'=日线, 'W'=周线, 'M'=月线，默认为'D'
+        output_format: 完整结果的保存格式，'parquet'或'xlsx'，默认不保存
     """
     try:
         # 周期名称映射
@@ -46,7 +54,8 @@ def main(period: str = 'D'):
         
         # 计算所有指标
         print(f"\n正在计算{period_name}技术指标...")
-        result_df = indicator.calculate_all(df.copy())
+        # calculate_all不会修改传入的df，无需复制
+        result_df = indicator.calculate_all(df)
         print("[OK] 指标计算完成")
         
         # 显示关键指标
@@ -100,10 +109,18 @@ def main(period: str = 'D'):
                 sell_display['date'] = pd.to_datetime(sell_display['date']).dt.strftime('%Y-%m-%d')
             print(sell_display.to_string(index=False))
         
-        # 保存结果
-        # output_file = 'data/159915_result.xlsx'
-        # result_df.to_excel(output_file, index=False)
-        # print(f"\n[OK] 完整结果已保存到: {output_file}")
+        # 保存结果（Parquet为列式压缩格式，写入比Excel快得多；需要Excel时使用--xlsx）
+        if output_format == 'parquet':
+            if PARQUET_AVAILABLE:
+                output_file = f'data/159915_result_{period}.parquet'
+                result_df.to_parquet(output_file, index=False)
+                print(f"\n[OK] 完整结果已保存到: {output_file}")
+            else:
+                print("\n[提示] 未安装pyarrow，无法保存Parquet格式结果（可使用--xlsx保存为Excel）")
+        elif output_format == 'xlsx':
+            output_file = f'data/159915_result_{period}.xlsx'
+            result_df.to_excel(output_file, index=False)
+            print(f"\n[OK] 完整结果已保存到: {output_file}")
         print("=" * 60)
         
     except FileNotFoundError:
@@ -116,20 +133,27 @@ def main(period: str = 'D'):
 
 
 if __name__ == '__main__':
-    # 从命令行参数获取周期类型，默认为日线
+    # 从命令行参数获取周期类型，默认为日线；--parquet/--xlsx指定结果保存格式
     period = 'D'  # 默认日线
+    output_format = None
+    args = []
+    for arg in sys.argv[1:]:
+        if arg in OUTPUT_FORMAT_FLAGS:
+            output_format = OUTPUT_FORMAT_FLAGS[arg]
+        else:
+            args.append(arg)
     
-    if len(sys.argv) > 1:
-        period_arg = sys.argv[1].upper()
+    if len(args) > 0:
+        period_arg = args[0].upper()
         if period_arg in ['D', 'W', 'M']:
             period = period_arg
         else:
-            print(f"警告: 无效的周期参数 '{sys.argv[1]}'，使用默认值: 日线(D)")
+            print(f"警告: 无效的周期参数 '{args[0]}'，使用默认值: 日线(D)")
             print("支持的周期: D=日线, W=周线, M=月线")
-            print("使用方法: python main.py [D|W|M]")
+            print("使用方法: python main.py [D|W|M] [--parquet|--xlsx]")
     
     # 如果没有提供参数，显示使用说明
-    if len(sys.argv) == 1:
+    if len(args) == 0:
         print("=" * 60)
         print("股票技术指标计算程序")
         print("=" * 60)
@@ -137,8 +161,9 @@ if __name__ == '__main__':
         print("  python main.py D   # 计算日线信号（默认）")
         print("  python main.py W   # 计算周线信号")
         print("  python main.py M   # 计算月线信号")
+        print("  python main.py D --parquet   # 计算并将完整结果保存为Parquet文件（--xlsx保存为Excel）")
         print("\n" + "=" * 60)
         print("正在使用默认周期: 日线(D)")
         print("=" * 60 + "\n")
     
-    main(period)
+    main(period, output_format)
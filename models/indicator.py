@@ -3,21 +3,253 @@
 基于通达信公式转换
 """
 
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
 import numpy as np
+from utils.jit import njit, NUMBA_AVAILABLE
+
+# calculate_all读取的输入列（趋势线_原始存在时直接使用表格中的趋势线）
+INDICATOR_INPUT_COLS = ['date', 'open', 'high', 'low', 'close', 'volume', '趋势线_原始']
+
+# BB条件：REF(趋势线,1)所在区间的边界，以及从各区间向上穿越的阈值（REF>11时没有对应条件）
+_BB_BOUNDS = np.array([0.0, 1.0, 3.0, 6.0, 11.0])
+_BB_CROSS_LEVELS = np.array([0.0, 1.0, 3.0, 6.0, 11.0, np.nan])
+
+# DD条件：REF(趋势线,1)所在区间的边界，以及从各区间向下穿越的阈值（REF<89或97<REF<99时没有对应条件）
+_DD_BOUNDS = np.array([89.0, 94.0, 97.0, 99.0, 100.0])
+_DD_CROSS_LEVELS = np.array([np.nan, 89.0, 94.0, np.nan, 99.0, 100.0])
+
+# calculate_all的计算步骤：'sr'=支撑阻力中线，'trend'=趋势线和V12，'signals'=买卖信号
+CALCULATION_STAGES = ('sr', 'trend', 'signals')
+
+
+@njit(cache=True, nogil=True)
+def _buy_signal_loop(trend_line, buy_threshold):
+    """
+    买入信号逐K线判断（与StockIndicator._calculate_buy_signals_python逻辑一致）
+    
+    Args:
+        trend_line: 趋势线float64数组（NaN表示无效值）
+        buy_threshold: 买入信号阈值
+        
+    Returns:
+        买入信号int8数组（1=买入）
+    """
+    n = len(trend_line)
+    buy_signals = np.zeros(n, dtype=np.int8)
+    
+    has_any_below_threshold = False
+    for k in range(n):
+        if trend_line[k] <= buy_threshold:
+            has_any_below_threshold = True
+            break
+    
+    # 记录最近一次趋势线高于buy_threshold的位置
+    last_above_threshold_idx = -1
+    for i in range(1, n):
+        prev_trend = trend_line[i - 1]
+        curr_trend = trend_line[i]
+        if np.isnan(prev_trend) or np.isnan(curr_trend):
+            continue
+        
+        if curr_trend > buy_threshold and prev_trend <= buy_threshold:
+            # 从下向上穿越，检查最近一次高于阈值之后（或从头开始）是否曾回落到阈值以下
+            has_below_threshold = False
+            if last_above_threshold_idx >= 0:
+                for j in range(last_above_threshold_idx + 1, i):
+                    if trend_line[j] <= buy_threshold:
+                        has_below_threshold = True
+                        break
+            elif has_any_below_threshold:
+                for j in range(i):
+                    if trend_line[j] <= buy_threshold:
+                        has_below_threshold = True
+                        break
+            if has_below_threshold:
+                buy_signals[i] = 1
+            last_above_threshold_idx = i
+        elif curr_trend > buy_threshold:
+            last_above_threshold_idx = i
+    return buy_signals
+
+
+@njit(cache=True, nogil=True)
+def _filter_signal_loop(signal, period):
+    """
+    FILTER函数逐K线实现（与StockIndicator._filter_signal逻辑一致）
+    
+    nogil编译：多线程批量计算时各线程可以并行执行本内核
+    
+    Args:
+        signal: 信号int8数组（0或1）
+        period: 过滤周期
+        
+    Returns:
+        过滤后的信号int8数组
+    """
+    result = np.zeros(len(signal), dtype=np.int8)
+    count = 0
+    for i in range(len(signal)):
+        if signal[i] == 1:
+            if count == 0:
+                result[i] = 1
+            count += 1
+            if count >= period:
+                count = 0
+        else:
+            count = 0
+    return result
+
+
+@njit(cache=True, nogil=True)
+def _ema_loop(values, alpha):
+    """
+    EMA递推（与pandas ewm(adjust=False)的计算顺序一致，结果逐位相同）
+    
+    Args:
+        values: 不含NaN的float64数组
+        alpha: 平滑系数
+        
+    Returns:
+        EMA float64数组
+    """
+    result = np.empty_like(values)
+    if len(values) == 0:
+        return result
+    old_weight = 1.0 - alpha
+    weighted = values[0]
+    result[0] = weighted
+    for i in range(1, len(values)):
+        weighted = (old_weight * weighted + alpha * values[i]) / (old_weight + alpha)
+        result[i] = weighted
+    return result
+
+
+@njit(cache=True, nogil=True)
+def _support_resistance_loop(close, high, low):
+    """
+    支撑位、阻力位和中线的单次遍历实现（与StockIndicator._support_resistance_arrays逻辑一致）
+    
+    Args:
+        close: 收盘价float64数组
+        high: 最高价float64数组
+        low: 最低价float64数组
+        
+    Returns:
+        (阻力, 支撑, 中线) float64数组
+    """
+    n = len(close)
+    resistance = np.empty(n, dtype=np.float64)
+    support = np.empty(n, dtype=np.float64)
+    midline = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        # 前一根K线的数据，缺失时用首个值填充
+        prev_close = close[i - 1] if i > 0 else np.nan
+        prev_high = high[i - 1] if i > 0 else np.nan
+        prev_low = low[i - 1] if i > 0 else np.nan
+        if np.isnan(prev_close):
+            prev_close = close[0]
+        if np.isnan(prev_high):
+            prev_high = high[0]
+        if np.isnan(prev_low):
+            prev_low = low[0]
+        
+        # H1 = MAX(昨收, 最高)，L1 = MIN(昨收, 最低)（任一为NaN时结果为NaN，与np.maximum/np.minimum一致）
+        if np.isnan(prev_close) or np.isnan(prev_high):
+            h1 = np.nan
+        else:
+            h1 = max(prev_close, prev_high)
+        if np.isnan(prev_close) or np.isnan(prev_low):
+            l1 = np.nan
+        else:
+            l1 = min(prev_close, prev_low)
+        
+        p1 = h1 - l1
+        resistance[i] = l1 + p1 * 7 / 8
+        support[i] = l1 + p1 * 0.5 / 8
+        midline[i] = (support[i] + resistance[i]) / 2
+    return resistance, support, midline
+
+
+def warmup():
+    """
+    预先编译numba内核（已编译或命中磁盘缓存时几乎没有开销），避免首个请求承担编译时间
+    """
+    _buy_signal_loop(np.array([5.0, 15.0, np.nan], dtype=np.float64), 10.0)
+    _filter_signal_loop(np.array([1, 0, 1], dtype=np.int8), 15)
+    _ema_loop(np.array([1.0, 2.0, 3.0], dtype=np.float64), 0.5)
+    _support_resistance_loop(np.array([1.0, np.nan]), np.array([2.0, 3.0]), np.array([0.5, 1.0]))
+
+
+def _column_values(df: pd.DataFrame, col: str) -> np.ndarray:
+    """
+    读取DataFrame列为float64数组（缺失值转为NaN）
+    """
+    return df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _raw_trend_values(df: pd.DataFrame):
+    """
+    读取Excel中的趋势线（趋势线_原始列），不存在时返回None
+    """
+    if '趋势线_原始' not in df.columns:
+        return None
+    return pd.to_numeric(df['趋势线_原始'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _bucket_cross(ref_trend: np.ndarray, trend_line: np.ndarray, bounds: np.ndarray, cross_levels: np.ndarray,
+                  upward: bool) -> np.ndarray:
+    """
+    分区间穿越判断：REF(趋势线,1)严格位于bounds划分的某个区间内部时，判断趋势线是否穿越该区间对应的阈值
+    
+    Args:
+        ref_trend: REF(趋势线,1) float64数组
+        trend_line: 趋势线float64数组
+        bounds: 升序的区间边界
+        cross_levels: 各区间（共len(bounds)+1个）对应的穿越阈值，NaN表示该区间没有条件
+        upward: True=向上穿越（趋势线>阈值），False=向下穿越（趋势线<阈值）
+        
+    Returns:
+        布尔数组（NaN参与比较时为False）
+    """
+    # 区间编号；REF恰好等于边界时左右查找结果不同，不属于任何区间内部（NaN排在末尾，对应最后一个区间）
+    bucket = np.searchsorted(bounds, ref_trend, side='right')
+    interior = bucket == np.searchsorted(bounds, ref_trend, side='left')
+    levels = cross_levels[bucket]
+    crossed = trend_line > levels if upward else trend_line < levels
+    return interior & crossed & ~np.isnan(ref_trend)
+
+
+def _shift_fill_first(values: np.ndarray) -> np.ndarray:
+    """
+    REF(X,1)，缺失值用首个值填充（等价于shift(1).fillna(X.iloc[0])）
+    """
+    shifted = np.empty_like(values)
+    shifted[0:1] = np.nan
+    shifted[1:] = values[:-1]
+    if len(values):
+        shifted[np.isnan(shifted)] = values[0]
+    return shifted
 
 
 class StockIndicator:
     """股票技术指标计算类"""
     
-    def __init__(self, n: int = 5):
+    def __init__(self, n: int = 5, engine: str = 'python'):
         """
         初始化
         
         Args:
             n: 计算周期，默认5
+            engine: 逐K线循环的执行方式，'python'=纯Python实现，'numba'=使用numba编译的内核
+                （未安装numba时内核以普通Python函数运行，结果相同）
         """
+        if engine not in ('python', 'numba'):
+            raise ValueError(f"engine必须是'python'或'numba'，当前为: {engine}")
         self.n = n
+        self.engine = engine
     
     def sma(self, data: pd.Series, period: int) -> pd.Series:
         """
@@ -26,11 +258,11 @@ class StockIndicator:
         Args:
             data: 数据序列
             period: 周期
-            
+        
         Returns:
             移动平均线序列
         """
-        return data.rolling(window=period, min_periods=1).mean()
+        return pd.Series(self._sma_values(data.to_numpy(dtype=np.float64, na_value=np.nan), period), index=data.index)
     
     def ema(self, data: pd.Series, period: int) -> pd.Series:
         """
@@ -39,11 +271,34 @@ class StockIndicator:
         Args:
             data: 数据序列
             period: 周期
-            
+        
         Returns:
             指数移动平均线序列
         """
-        return data.ewm(span=period, adjust=False).mean()
+        return pd.Series(self._ema_values(data.to_numpy(dtype=np.float64, na_value=np.nan), period), index=data.index)
+    
+    def _sma_values(self, values: np.ndarray, period: int) -> np.ndarray:
+        """
+        简单移动平均线的数组实现（min_periods=1）
+        """
+        if len(values) == 0 or np.isnan(values).any():
+            return pd.Series(values).rolling(window=period, min_periods=1).mean().to_numpy()
+        
+        # 不含NaN时窗口内数据个数为min(i+1, period)：窗口和由period个错位切片累加得到
+        # （不用cumsum相减，避免长序列上累计误差增大）
+        total = values.copy()
+        for lag in range(1, min(period, len(values))):
+            total[lag:] += values[:-lag]
+        counts = np.minimum(np.arange(1, len(values) + 1), period)
+        return total / counts
+    
+    def _ema_values(self, values: np.ndarray, period: int) -> np.ndarray:
+        """
+        指数移动平均线的数组实现（adjust=False）
+        """
+        if self.engine == 'numba' and not np.isnan(values).any():
+            return _ema_loop(values, 2.0 / (period + 1))
+        return pd.Series(values).ewm(span=period, adjust=False).mean().to_numpy()
     
     def calculate_support_resistance(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -51,15 +306,33 @@ class StockIndicator:
         
         Args:
             df: 包含股票数据的DataFrame，需要包含'close', 'high', 'low'列
-            
+        
         Returns:
             添加了支撑、阻力、中线列的DataFrame
         """
+        columns = self._support_resistance_arrays(_column_values(df, 'close'), _column_values(df, 'high'),
+                                                  _column_values(df, 'low'))
+        for col, values in columns.items():
+            df[col] = values
+        return df
+    
+    def _support_resistance_arrays(self, close: np.ndarray, high: np.ndarray, low: np.ndarray) -> dict:
+        """
+        支撑位、阻力位和中线的数组实现
+        
+        Returns:
+            {'阻力': ..., '支撑': ..., '中线': ...}
+        """
+        if self.engine == 'numba':
+            # 单次遍历直接得到三列，不生成中间数组
+            resistance, support, midline = _support_resistance_loop(close, high, low)
+            return {'阻力': resistance, '支撑': support, '中线': midline}
+        
         # DYNAINFO(3) 昨收, DYNAINFO(5) 最高, DYNAINFO(6) 最低
         # 使用前一日的数据作为参考
-        prev_close = df['close'].shift(1).fillna(df['close'].iloc[0])
-        prev_high = df['high'].shift(1).fillna(df['high'].iloc[0])
-        prev_low = df['low'].shift(1).fillna(df['low'].iloc[0])
+        prev_close = _shift_fill_first(close)
+        prev_high = _shift_fill_first(high)
+        prev_low = _shift_fill_first(low)
         
         # H1 = MAX(昨收, 最高)
         h1 = np.maximum(prev_close, prev_high)
@@ -71,15 +344,13 @@ class StockIndicator:
         p1 = h1 - l1
         
         # 阻力 = L1 + P1 * 7/8
-        df['阻力'] = l1 + p1 * 7 / 8
+        resistance = l1 + p1 * 7 / 8
         
         # 支撑 = L1 + P1 * 0.5/8
-        df['支撑'] = l1 + p1 * 0.5 / 8
+        support = l1 + p1 * 0.5 / 8
         
         # 中线 = (支撑 + 阻力) / 2
-        df['中线'] = (df['支撑'] + df['阻力']) / 2
-        
-        return df
+        return {'阻力': resistance, '支撑': support, '中线': (support + resistance) / 2}
     
     def calculate_trend_line(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -87,55 +358,75 @@ class StockIndicator:
         
         Args:
             df: 包含股票数据的DataFrame，需要包含'close', 'high', 'low'列
-            
+        
         Returns:
             添加了趋势线相关列的DataFrame
         """
-        # 如果数据中已经有趋势线列（从Excel中读取的），直接使用
+        columns = self._trend_line_arrays(_column_values(df, 'close'), _column_values(df, 'high'),
+                                          _column_values(df, 'low'), _raw_trend_values(df))
         if '趋势线_原始' in df.columns:
-            # 使用Excel中的趋势线数据
-            df['趋势线'] = pd.to_numeric(df['趋势线_原始'], errors='coerce')
             # 删除临时列
             df = df.drop(columns=['趋势线_原始'])
-            
-            # 计算V12
-            df['V12'] = (df['趋势线'] - df['趋势线'].shift(1)) / df['趋势线'].shift(1).replace(0, np.nan) * 100
-            
-            return df
+        for col, values in columns.items():
+            df[col] = values
+        return df
+    
+    def _trend_line_arrays(self, close: np.ndarray, high: np.ndarray, low: np.ndarray,
+                           raw_trend: np.ndarray = None) -> dict:
+        """
+        趋势线和V12的数组实现
         
-        # 如果没有趋势线列，则进行计算
-        close = df['close']
-        high = df['high']
-        low = df['low']
+        Args:
+            raw_trend: Excel中读取的趋势线（不为None时直接使用，不再计算）
+        
+        Returns:
+            {'趋势线': ..., 'V12': ...}
+        """
+        if raw_trend is not None:
+            return {'趋势线': raw_trend, 'V12': self._calculate_v12(raw_trend)}
         
         # 计算N周期内的最高价和最低价
-        hhv = high.rolling(window=self.n, min_periods=1).max()
-        llv = low.rolling(window=self.n, min_periods=1).min()
+        hhv = pd.Series(high).rolling(window=self.n, min_periods=1).max().to_numpy()
+        llv = pd.Series(low).rolling(window=self.n, min_periods=1).min().to_numpy()
         
         # 避免除零
         denominator = hhv - llv
-        denominator = denominator.replace(0, pd.NA)
+        denominator = np.where(denominator == 0, np.nan, denominator)
         
         # (C-LLV(L,N))/(HHV(H,N)-LLV(L,N))*100
         ratio = (close - llv) / denominator * 100
-        ratio = ratio.fillna(50)  # 如果分母为0，填充50（中间值）
+        ratio[np.isnan(ratio)] = 50  # 如果分母为0，填充50（中间值）
         
         # 第一层SMA: SMA(ratio, 5, 1)
-        sma1 = self.sma(ratio, 5)
+        sma1 = self._sma_values(ratio, 5)
         
         # 第二层SMA: SMA(SMA(ratio, 5, 1), 3, 1)
-        sma2 = self.sma(sma1, 3)
+        sma2 = self._sma_values(sma1, 3)
         
         # V11 = 3*SMA1 - 2*SMA2
         v11 = 3 * sma1 - 2 * sma2
         
         # 趋势线 = EMA(V11, 3)
-        df['趋势线'] = self.ema(v11, 3)
+        trend_line = self._ema_values(v11, 3)
         
         # V12 = (趋势线 - REF(趋势线,1)) / REF(趋势线,1) * 100
-        df['V12'] = (df['趋势线'] - df['趋势线'].shift(1)) / df['趋势线'].shift(1).replace(0, pd.NA) * 100
+        return {'趋势线': trend_line, 'V12': self._calculate_v12(trend_line)}
+    
+    @staticmethod
+    def _calculate_v12(trend_line: np.ndarray) -> np.ndarray:
+        """
+        V12 = (趋势线 - REF(趋势线,1)) / REF(趋势线,1) * 100，REF为0时结果为NaN
         
-        return df
+        Args:
+            trend_line: 趋势线float64数组
+        
+        Returns:
+            V12 float64数组
+        """
+        prev_trend = np.empty_like(trend_line)
+        prev_trend[0:1] = np.nan
+        prev_trend[1:] = trend_line[:-1]
+        return (trend_line - prev_trend) / np.where(prev_trend == 0, np.nan, prev_trend) * 100
     
     def calculate_signals(self, df: pd.DataFrame, buy_threshold: float = 10.0) -> pd.DataFrame:
         """
@@ -144,44 +435,121 @@ class StockIndicator:
         Args:
             df: 包含趋势线和价格数据的DataFrame
             buy_threshold: 买入信号阈值，趋势线从下向上穿越此值进行买入（默认10.0）
-            
+        
         Returns:
             添加了信号列的DataFrame
         """
-        trend_line = df['趋势线']
-        close = df['close']
-        midline = df['中线']
+        columns = self._signal_arrays(_column_values(df, '趋势线'), _column_values(df, 'close'),
+                                      _column_values(df, '中线'), buy_threshold)
+        for col, values in columns.items():
+            df[col] = values
+        return df
+    
+    def _signal_arrays(self, trend_line: np.ndarray, close: np.ndarray, midline: np.ndarray,
+                       buy_threshold: float) -> dict:
+        """
+        买卖信号的数组实现（NaN参与比较时结果为False，与Series比较一致）
         
+        Returns:
+            信号列名到数组的有序字典（0/1信号列和参考线为int8，减少内存占用）
+        """
         # 数据验证：确保趋势线数据有效
-        if trend_line.isna().all():
+        if np.isnan(trend_line).all():
             raise ValueError('趋势线数据全部为NaN，无法计算买入信号')
         
+        # REF(趋势线,1)：只计算一次，供BB/DD各条件共用
+        ref_trend = np.empty_like(trend_line)
+        ref_trend[0:1] = np.nan
+        ref_trend[1:] = trend_line[:-1]
+        
+        columns = {}
+        
         # 超卖区判断 (趋势线 < 10)
-        df['超卖区'] = (trend_line < 10).astype(int)
+        columns['超卖区'] = (trend_line < 10).astype(np.int8)
         
         # 超买区判断 (趋势线 > 90)
-        df['超买区'] = (trend_line > 90).astype(int)
+        columns['超买区'] = (trend_line > 90).astype(np.int8)
         
         # 买入信号: 趋势线必须先回落到buy_threshold（或以下），然后从下向上穿越buy_threshold
         # 严格逻辑：在从下向上穿越buy_threshold之前，趋势线必须曾经在buy_threshold以下
         # 如果趋势线前面一天/周/月没有回落到buy_threshold以下，即使拐点向上也不进行购买
+        if self.engine == 'numba':
+            buy_flags = _buy_signal_loop(trend_line, float(buy_threshold))
+        else:
+            buy_flags = self._calculate_buy_signals_python(trend_line, buy_threshold)
+        buy_reason = f'趋势线回落到{buy_threshold}以下后，从下向上穿越{buy_threshold}'
+        columns['买'] = buy_flags
+        columns['买入原因'] = pd.array(np.where(buy_flags == 1, buy_reason, ''), dtype=str)
+        
+        # 卖出信号：已移除"趋势线从上向下穿越90"策略
+        # 卖出逻辑现在只在回测中使用（止盈、止损、20均线下方3天）
+        columns['卖'] = np.zeros(len(trend_line), dtype=np.int8)
+        columns['卖出原因'] = pd.array([''] * len(trend_line), dtype=str)
+        
+        # AA条件: (趋势线<11) AND FILTER((趋势线<=11),15) AND C<中线
+        # FILTER函数：过滤连续满足条件的信号，只保留第一次
+        filter_aa = self._filter_signal_array(trend_line <= 11, 15)
+        columns['AA'] = ((trend_line < 11) & filter_aa & (close < midline)).astype(np.int8)
+        
+        # BB条件: 多个买入条件
+        # BB1: REF(趋势线,1)<11 AND REF(趋势线,1)>6 AND CROSS(趋势线,11)
+        # BB2: REF(趋势线,1)<6 AND REF(趋势线,1)>3 AND CROSS(趋势线,6)
+        # BB3: REF(趋势线,1)<3 AND REF(趋势线,1)>1 AND CROSS(趋势线,3)
+        # BB4: REF(趋势线,1)<1 AND REF(趋势线,1)>0 AND CROSS(趋势线,1)
+        # BB5: REF(趋势线,1)<0 AND CROSS(趋势线,0)
+        # 即REF(趋势线,1)位于某个区间内部时，趋势线向上穿越该区间的上边界：按区间编号一次查出穿越阈值
+        bb = _bucket_cross(ref_trend, trend_line, _BB_BOUNDS, _BB_CROSS_LEVELS, upward=True)
+        columns['BB'] = bb.astype(np.int8)
+        
+        # CC条件: (趋势线>89) AND FILTER((趋势线>89),15) AND C>中线
+        above_89 = trend_line > 89
+        filter_cc = self._filter_signal_array(above_89, 15)
+        columns['CC'] = (above_89 & filter_cc & (close > midline)).astype(np.int8)
         
-        # 初始化买入信号和买入原因
-        buy_signals = pd.Series(0, index=df.index, dtype=int)
-        buy_reasons = pd.Series('', index=df.index, dtype=str)
+        # DD条件: 多个卖出条件
+        # DD1: REF(趋势线,1)>89 AND REF(趋势线,1)<94 AND CROSS(89,趋势线)
+        # DD2: REF(趋势线,1)>94 AND REF(趋势线,1)<97 AND CROSS(94,趋势线)
+        # DD3: REF(趋势线,1)>97 AND REF(趋势线,1)>99 AND CROSS(97,趋势线)
+        # DD4: REF(趋势线,1)>99 AND REF(趋势线,1)<100 AND CROSS(99,趋势线)
+        # DD5: REF(趋势线,1)>100 AND CROSS(100,趋势线)
+        # 即REF(趋势线,1)位于某个区间内部时，趋势线向下穿越该区间的下边界；
+        # DD3按原公式只在REF>99时生效，除REF恰好等于100外都被DD4/DD5覆盖，单独处理这一点
+        dd = _bucket_cross(ref_trend, trend_line, _DD_BOUNDS, _DD_CROSS_LEVELS, upward=False)
+        dd |= (ref_trend == 100) & (trend_line < 97)
+        columns['DD'] = dd.astype(np.int8)
+        
+        # 添加参考线
+        columns['顶'] = np.full(len(trend_line), 90, dtype=np.int8)
+        columns['底'] = np.full(len(trend_line), 10, dtype=np.int8)
+        columns['中'] = np.full(len(trend_line), 50, dtype=np.int8)
+        
+        return columns
+    
+    def _calculate_buy_signals_python(self, trend_values: np.ndarray, buy_threshold: float) -> np.ndarray:
+        """
+        买入信号的纯Python实现（engine='python'）
+        
+        Args:
+            trend_values: 趋势线float64数组（标量用math.isnan判断NaN，避免iloc和pd.isna的开销）
+            buy_threshold: 买入信号阈值
+        
+        Returns:
+            买入信号int8数组（1=买入）
+        """
+        buy_signals = np.zeros(len(trend_values), dtype=np.int8)
         
         # 记录最近一次趋势线高于buy_threshold的位置
         last_above_threshold_idx = -1
         
         # 优化：预先检查是否有任何数据低于阈值，避免不必要的循环
-        has_any_below_threshold = (trend_line <= buy_threshold).any()
+        has_any_below_threshold = bool((trend_values <= buy_threshold).any())
         
-        for i in range(1, len(trend_line)):
-            prev_trend = trend_line.iloc[i - 1]
-            curr_trend = trend_line.iloc[i]
+        for i in range(1, len(trend_values)):
+            prev_trend = trend_values[i - 1]
+            curr_trend = trend_values[i]
             
             # 跳过NaN值
-            if pd.isna(prev_trend) or pd.isna(curr_trend):
+            if math.isnan(prev_trend) or math.isnan(curr_trend):
                 continue
             
             # 检查是否从下向上穿越buy_threshold（当前>buy_threshold，前一日<=buy_threshold）
@@ -198,8 +566,8 @@ class StockIndicator:
                     # 确保检查范围有效
                     if check_start < check_end:
                         for j in range(check_start, check_end):
-                            trend_val = trend_line.iloc[j]
-                            if pd.notna(trend_val) and trend_val <= buy_threshold:
+                            trend_val = trend_values[j]
+                            if not math.isnan(trend_val) and trend_val <= buy_threshold:
                                 has_below_threshold = True
                                 break
                 else:
@@ -208,94 +576,21 @@ class StockIndicator:
                     if i > 0 and has_any_below_threshold:
                         # 优化：如果整个序列都没有低于阈值的数据，直接跳过
                         for j in range(i):
-                            trend_val = trend_line.iloc[j]
-                            if pd.notna(trend_val) and trend_val <= buy_threshold:
+                            trend_val = trend_values[j]
+                            if not math.isnan(trend_val) and trend_val <= buy_threshold:
                                 has_below_threshold = True
                                 break
                 
                 if has_below_threshold:
                     # 确实曾经回落到buy_threshold以下，可以买入
-                    buy_signals.iloc[i] = 1
-                    buy_reasons.iloc[i] = f'趋势线回落到{buy_threshold}以下后，从下向上穿越{buy_threshold}'
-                    last_above_threshold_idx = i
-                else:
-                    # 没有回落到buy_threshold以下，不买入（即使拐点向上）
-                    last_above_threshold_idx = i
-            elif pd.notna(curr_trend) and curr_trend > buy_threshold:
+                    buy_signals[i] = 1
+                # 无论是否买入（没有回落到buy_threshold以下时即使拐点向上也不买入），都更新最近一次高于阈值的位置
+                last_above_threshold_idx = i
+            elif not math.isnan(curr_trend) and curr_trend > buy_threshold:
                 # 趋势线在buy_threshold以上，更新最近一次高于buy_threshold的位置
                 last_above_threshold_idx = i
         
-        df['买'] = buy_signals
-        df['买入原因'] = buy_reasons
-        
-        # 卖出信号：已移除"趋势线从上向下穿越90"策略
-        # 卖出逻辑现在只在回测中使用（止盈、止损、20均线下方3天）
-        df['卖'] = pd.Series(0, index=df.index, dtype=int)
-        df['卖出原因'] = pd.Series('', index=df.index, dtype=str)
-        
-        # AA条件: (趋势线<11) AND FILTER((趋势线<=11),15) AND C<中线
-        # FILTER函数：过滤连续满足条件的信号，只保留第一次
-        trend_below_11 = (trend_line <= 11).astype(int)
-        filter_aa = self._filter_signal(trend_below_11, 15)
-        df['AA'] = ((trend_line < 11) & filter_aa & (close < midline)).astype(int)
-        
-        # BB条件: 多个买入条件
-        ref_trend = trend_line.shift(1)
-        
-        # BB1: REF(趋势线,1)<11 AND REF(趋势线,1)>6 AND CROSS(趋势线,11)
-        bb1 = ((ref_trend < 11) & (ref_trend > 6) & 
-               (trend_line > 11) & (ref_trend <= 11)).astype(int)
-        
-        # BB2: REF(趋势线,1)<6 AND REF(趋势线,1)>3 AND CROSS(趋势线,6)
-        bb2 = ((ref_trend < 6) & (ref_trend > 3) & 
-               (trend_line > 6) & (ref_trend <= 6)).astype(int)
-        
-        # BB3: REF(趋势线,1)<3 AND REF(趋势线,1)>1 AND CROSS(趋势线,3)
-        bb3 = ((ref_trend < 3) & (ref_trend > 1) & 
-               (trend_line > 3) & (ref_trend <= 3)).astype(int)
-        
-        # BB4: REF(趋势线,1)<1 AND REF(趋势线,1)>0 AND CROSS(趋势线,1)
-        bb4 = ((ref_trend < 1) & (ref_trend > 0) & 
-               (trend_line > 1) & (ref_trend <= 1)).astype(int)
-        
-        # BB5: REF(趋势线,1)<0 AND CROSS(趋势线,0)
-        bb5 = ((ref_trend < 0) & (trend_line > 0) & (ref_trend <= 0)).astype(int)
-        
-        df['BB'] = (bb1 | bb2 | bb3 | bb4 | bb5).astype(int)
-        
-        # CC条件: (趋势线>89) AND FILTER((趋势线>89),15) AND C>中线
-        trend_above_89 = (trend_line > 89).astype(int)
-        filter_cc = self._filter_signal(trend_above_89, 15)
-        df['CC'] = ((trend_line > 89) & filter_cc & (close > midline)).astype(int)
-        
-        # DD条件: 多个卖出条件
-        # DD1: REF(趋势线,1)>89 AND REF(趋势线,1)<94 AND CROSS(89,趋势线)
-        dd1 = ((ref_trend > 89) & (ref_trend < 94) & 
-               (trend_line < 89) & (ref_trend >= 89)).astype(int)
-        
-        # DD2: REF(趋势线,1)>94 AND REF(趋势线,1)<97 AND CROSS(94,趋势线)
-        dd2 = ((ref_trend > 94) & (ref_trend < 97) & 
-               (trend_line < 94) & (ref_trend >= 94)).astype(int)
-        
-        # DD3: REF(趋势线,1)>97 AND REF(趋势线,1)>99 AND CROSS(97,趋势线)
-        dd3 = ((ref_trend > 97) & (ref_trend > 99) & 
-               (trend_line < 97) & (ref_trend >= 97)).astype(int)
-        
-        # DD4: REF(趋势线,1)>99 AND REF(趋势线,1)<100 AND CROSS(99,趋势线)
-        dd4 = ((ref_trend > 99) & (ref_trend < 100) & 
-               (trend_line < 99) & (ref_trend >= 99)).astype(int)
-        
-        # DD5: REF(趋势线,1)>100 AND CROSS(100,趋势线)
-        dd5 = ((ref_trend > 100) & (trend_line < 100) & (ref_trend >= 100)).astype(int)
-        
-        df['DD'] = (dd1 | dd2 | dd3 | dd4 | dd5).astype(int)
-        
-        # 添加参考线
-        df['顶'] = 90
-        df['底'] = 10
-        df['中'] = 50
-        
-        return df
+        return buy_signals
     
     def _filter_signal(self, signal: pd.Series, period: int) -> pd.Series:
         """
@@ -304,26 +599,40 @@ class StockIndicator:
         Args:
             signal: 信号序列（0或1）
             period: 过滤周期
-            
+        
         Returns:
-            过滤后的信号序列
-        """
-        result = pd.Series(0, index=signal.index)
-        count = 0
-        
-        for i in range(len(signal)):
-            if signal.iloc[i] == 1:
-                if count == 0:
-                    result.iloc[i] = 1
-                count += 1
-                if count >= period:
-                    count = 0
-            else:
-                count = 0
+            过滤后的int8信号序列（与其他信号列一致）
+        """
+        filtered = self._filter_signal_array(signal.to_numpy() == 1, period)
+        # 布尔结果直接按int8解释，不再复制为int64
+        return pd.Series(filtered.view(np.int8), index=signal.index)
+    
+    def _filter_signal_array(self, ones: np.ndarray, period: int) -> np.ndarray:
+        """
+        FILTER函数的数组实现（_filter_signal和calculate_signals共用）
         
-        return result
+        Args:
+            ones: 信号布尔数组
+            period: 过滤周期
+        
+        Returns:
+            过滤后的信号布尔数组
+        """
+        if self.engine == 'numba':
+            return _filter_signal_loop(ones.view(np.int8), period) == 1
+        
+        # 向量化实现：连续为1的区间内，距区间起点的偏移为period整数倍的位置保留信号
+        # （等价于逐K线计数，连续满足period次后计数清零重新开始）
+        if not ones.any():
+            return np.zeros(len(ones), dtype=bool)
+        positions = np.arange(len(ones))
+        run_starts = ones.copy()
+        run_starts[1:] &= ~ones[:-1]
+        run_start_idx = np.maximum.accumulate(np.where(run_starts, positions, 0))
+        return ones & ((positions - run_start_idx) % period == 0)
     
-    def calculate_all(self, df: pd.DataFrame, buy_threshold: float = 10.0) -> pd.DataFrame:
+    def calculate_all(self, df: pd.DataFrame, buy_threshold: float = 10.0,
+                      stages: tuple = CALCULATION_STAGES) -> pd.DataFrame:
         """
         计算所有指标
         
@@ -331,26 +640,77 @@ class StockIndicator:
             df: 包含股票数据的DataFrame，需要包含'date', 'open', 'high', 'low', 'close', 'volume'列
                 如果列名不同，需要先重命名
             buy_threshold: 买入信号阈值，趋势线从下向上穿越此值进行买入（默认10.0）
-            
+            stages: 需要计算的步骤（默认全部计算），只需要支撑阻力或趋势线时可跳过信号计算；
+                'signals'依赖中线和趋势线，包含'signals'时会同时计算'sr'和'trend'
+        
         Returns:
-            添加了所有指标列的DataFrame
+            添加了所有指标列的DataFrame（不会修改传入的df）
         """
-        # 确保数据按日期排序
-        if 'date' in df.columns:
+        unknown_stages = [stage for stage in stages if stage not in CALCULATION_STAGES]
+        if unknown_stages:
+            raise ValueError(f"stages只能包含{CALCULATION_STAGES}，当前为: {unknown_stages}")
+        calculate_signals = 'signals' in stages
+        calculate_sr = calculate_signals or 'sr' in stages
+        calculate_trend = calculate_signals or 'trend' in stages
+        
+        # 确保数据按日期排序（排序会生成新的DataFrame，调用方无需事先复制）
+        if 'date' in df.columns and not df['date'].is_monotonic_increasing:
             df = df.sort_values('date').reset_index(drop=True)
+        elif 'date' in df.columns:
+            # 已按日期排序（如缓存的日线数据），只重建索引
+            df = df.reset_index(drop=True)
+        else:
+            # 浅拷贝：新增指标列不影响调用方的DataFrame
+            df = df.copy(deep=False)
+        
+        # 输入列只提取一次为float64数组，各步骤在数组上计算，最后一次性写回DataFrame
+        close = _column_values(df, 'close')
+        high = _column_values(df, 'high')
+        low = _column_values(df, 'low')
+        columns = {}
         
         # 计算支撑阻力
-        df = self.calculate_support_resistance(df)
+        if calculate_sr:
+            columns.update(self._support_resistance_arrays(close, high, low))
         
         # 计算趋势线
-        df = self.calculate_trend_line(df)
+        if calculate_trend:
+            raw_trend = _raw_trend_values(df)
+            if raw_trend is not None:
+                df = df.drop(columns=['趋势线_原始'])
+            columns.update(self._trend_line_arrays(close, high, low, raw_trend))
         
         # 计算信号
-        df = self.calculate_signals(df, buy_threshold=buy_threshold)
+        if calculate_signals:
+            columns.update(self._signal_arrays(columns['趋势线'], close, columns['中线'], buy_threshold))
         
-        return df
-
-
-
-
-
+        return df.assign(**columns)
+    
+    def calculate_all_batch(self, dfs: dict, buy_threshold: float = 10.0, max_workers: int = None) -> dict:
+        """
+        并行计算多个标的的全部指标（各标的之间相互独立）
+        
+        engine='numba'且已安装numba时使用线程池：逐K线内核以nogil编译，线程间可以并行执行，
+        且不需要像进程池那样序列化传递DataFrame；否则使用进程池
+        
+        Args:
+            dfs: 标的名称到股票数据DataFrame的字典
+            buy_threshold: 买入信号阈值
+            max_workers: 最大线程/进程数，默认使用CPU核数
+            
+        Returns:
+            标的名称到指标结果DataFrame的字典（顺序与dfs一致）
+        """
+        if not dfs:
+            return {}
+        
+        keys = list(dfs)
+        frames = [dfs[key] for key in keys]
+        thresholds = [buy_threshold] * len(frames)
+        max_workers = min(max_workers or os.cpu_count() or 1, len(frames))
+        if max_workers <= 1:
+            return {key: self.calculate_all(df, buy_threshold=buy_threshold) for key, df in zip(keys, frames)}
+        
+        executor_cls = ThreadPoolExecutor if self.engine == 'numba' and NUMBA_AVAILABLE else ProcessPoolExecutor
+        with executor_cls(max_workers=max_workers) as executor:
+            return dict(zip(keys, executor.map(self.calculate_all, frames, thresholds)))
@@ -3,16 +3,25 @@
 负责计算回测结果
 """
 
+import math
+import os
 import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
 import numpy as np
 import logging
 import traceback
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
 from models.indicator import StockIndicator
 from utils.data_loader import load_stock_data
 from utils.period_converter import convert_to_period
-from services.indicator_service import IndicatorService
-from services.sell_strategies import create_strategy, SellStrategy
+from services.indicator_service import IndicatorService, format_decimal_array, to_json_list, format_date_list
+from services.sell_strategies import (
+    create_strategy, precompute_ma20_signals, SellContext, SellStrategy, BUILTIN_STRATEGY_COUNT,
+    scan_profit_threshold, scan_trailing_stop, scan_below_ma20,
+    STRATEGY_STOP_LOSS, STRATEGY_TAKE_PROFIT, STRATEGY_BELOW_MA20, STRATEGY_TRAILING_STOP
+)
+from utils.jit import njit, NUMBA_AVAILABLE
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -37,9 +46,371 @@ def format_decimal(value, decimals=3):
         return None
 
 
+# JIT回测循环中需要记录日志的事件编号
+EVENT_BUY_INVALID_OPEN = 1  # 买入信号被跳过：下一天开盘价无效
+EVENT_BUY_NO_CASH = 2  # 买入信号被跳过：现金不足
+EVENT_BUY_INVALID_SHARES = 3  # 买入信号被跳过：买入股数无效
+EVENT_BUY_NO_DAILY_IDX = 4  # 买入成功，但找不到买入日期对应的日线索引
+EVENT_SELL_INVALID_OPEN = 5  # 卖出信号被跳过：下一天开盘价无效
+EVENT_SELL_INVALID_SHARES = 6  # 卖出信号被跳过：持仓数量无效
+
+# 向量化回测买入后首次扫描的日线天数，没有触发时成倍扩大
+VECTORIZED_SCAN_DAYS = 64
+
+
+@njit(cache=True)
+def _run_backtest_loop(result_to_daily_idx, next_to_daily_idx, buy_signals, opens, daily_ma20, daily_closes,
+                       strategy_kinds, stop_loss_pct, take_profit_pct, below_ma20_days, below_ma20_min_profit,
+                       trailing_stop_pct, relation_is_and, initial_amount):
+    """
+    JIT编译的回测主循环，内联四种内置卖出策略
+
+    Args:
+        result_to_daily_idx: 每条周期数据对应的日线索引（-1表示找不到）
+        next_to_daily_idx: 每条周期数据的下一条数据对应的日线索引（-1表示找不到）
+        buy_signals: 买入信号数组
+        opens: 周期数据开盘价
+        daily_ma20/daily_closes: 日线20均线/收盘价
+        strategy_kinds: 按用户选择顺序排列的策略类型编号
+        take_profit_pct/below_ma20_min_profit: NaN表示未设置
+        relation_is_and: 策略关系是否为AND
+        initial_amount: 初始资金
+
+    Returns:
+        买入记录数组、卖出记录数组、日志事件数组及循环结束时的资金/持仓状态
+    """
+    n = len(buy_signals)
+    daily_len = len(daily_closes)
+    n_strategies = len(strategy_kinds)
+
+    buy_bars = np.empty(n, np.int64)
+    buy_prices = np.empty(n, np.float64)
+    buy_shares = np.empty(n, np.float64)
+    buy_amounts = np.empty(n, np.float64)
+    sell_bars = np.empty(n, np.int64)
+    sell_prices = np.empty(n, np.float64)
+    sell_shares = np.empty(n, np.float64)
+    sell_amounts = np.empty(n, np.float64)
+    sell_masks = np.empty(n, np.int64)
+    sell_hits = np.empty((n, 4), np.float64)
+    event_bars = np.empty(2 * n, np.int64)
+    event_codes = np.empty(2 * n, np.int64)
+    event_values = np.empty(2 * n, np.float64)
+    bar_hits = np.zeros(4, np.float64)
+    n_buys = 0
+    n_sells = 0
+    n_events = 0
+
+    cash = initial_amount
+    shares = 0.0
+    position = False
+    buy_price = 0.0
+    buy_date_idx = -1
+
+    # 各策略的状态（对应策略类中的实例变量）
+    sl_last_check_idx = -1
+    tp_last_check_idx = -1
+    ts_last_check_idx = -1
+    ts_highest_price = 0.0
+    ts_stop_loss_price = 0.0
+    ma_buy_below_ma20 = False
+    ma_crossed = False
+    ma_crossed_idx = -1
+    ma_below_days = 0
+    ma_last_check_idx = -1
+    ma_profit_reached = False
+
+    for i in range(n - 1):
+        next_open = opens[i + 1]
+        current_daily_idx = result_to_daily_idx[i]
+
+        if buy_signals[i] == 1 and not position:
+            if np.isnan(next_open) or next_open <= 0:
+                event_bars[n_events] = i
+                event_codes[n_events] = EVENT_BUY_INVALID_OPEN
+                event_values[n_events] = next_open
+                n_events += 1
+                continue
+            if cash <= 0:
+                event_bars[n_events] = i
+                event_codes[n_events] = EVENT_BUY_NO_CASH
+                event_values[n_events] = cash
+                n_events += 1
+                continue
+
+            buy_price = next_open
+            buy_amount = cash
+            shares = buy_amount / buy_price
+            if shares <= 0 or np.isnan(shares):
+                event_bars[n_events] = i
+                event_codes[n_events] = EVENT_BUY_INVALID_SHARES
+                event_values[n_events] = shares
+                n_events += 1
+                continue
+
+            cash = 0.0
+            position = True
+
+            buy_date_idx = next_to_daily_idx[i]
+            if buy_date_idx < 0:
+                event_bars[n_events] = i
+                event_codes[n_events] = EVENT_BUY_NO_DAILY_IDX
+                event_values[n_events] = np.nan
+                n_events += 1
+
+            buy_below_ma20 = False
+            if buy_date_idx >= 0 and buy_date_idx < daily_len:
+                buy_day_close = daily_closes[buy_date_idx]
+                buy_day_ma20 = daily_ma20[buy_date_idx]
+                if not np.isnan(buy_day_close) and not np.isnan(buy_day_ma20):
+                    buy_below_ma20 = buy_day_close < buy_day_ma20
+
+            # 重置所有策略状态并设置买入信息
+            sl_last_check_idx = buy_date_idx
+            tp_last_check_idx = buy_date_idx
+            ts_highest_price = buy_price
+            ts_last_check_idx = buy_date_idx if buy_date_idx >= 0 else -1
+            ts_stop_loss_price = buy_price * (1 - trailing_stop_pct / 100)
+            ma_buy_below_ma20 = buy_below_ma20
+            ma_crossed = False
+            ma_crossed_idx = -1
+            ma_below_days = 0
+            ma_last_check_idx = -1
+            ma_profit_reached = False
+
+            buy_bars[n_buys] = i + 1
+            buy_prices[n_buys] = buy_price
+            buy_shares[n_buys] = shares
+            buy_amounts[n_buys] = buy_amount
+            n_buys += 1
+
+        elif position:
+            sell_mask = 0
+            all_triggered = True
+
+            for s in range(n_strategies):
+                kind = strategy_kinds[s]
+                triggered = False
+                hit_close = 0.0
+                if kind == STRATEGY_STOP_LOSS:
+                    triggered, hit_close, sl_last_check_idx = scan_profit_threshold(
+                        daily_closes, buy_price, buy_date_idx, current_daily_idx, sl_last_check_idx,
+                        stop_loss_pct, False)
+                elif kind == STRATEGY_TAKE_PROFIT:
+                    if not np.isnan(take_profit_pct):
+                        triggered, hit_close, tp_last_check_idx = scan_profit_threshold(
+                            daily_closes, buy_price, buy_date_idx, current_daily_idx, tp_last_check_idx,
+                            take_profit_pct, True)
+                elif kind == STRATEGY_BELOW_MA20:
+                    (triggered, hit_close, ma_crossed, ma_crossed_idx, ma_below_days,
+                     ma_last_check_idx, ma_profit_reached) = scan_below_ma20(
+                        daily_closes, daily_ma20, buy_price, buy_date_idx, current_daily_idx, ma_buy_below_ma20,
+                        ma_crossed, ma_crossed_idx, ma_below_days, ma_last_check_idx, ma_profit_reached,
+                        below_ma20_days, below_ma20_min_profit)
+                elif kind == STRATEGY_TRAILING_STOP:
+                    (triggered, hit_close, ts_last_check_idx, ts_highest_price,
+                     ts_stop_loss_price) = scan_trailing_stop(
+                        daily_closes, buy_price, buy_date_idx, current_daily_idx, ts_last_check_idx,
+                        ts_highest_price, ts_stop_loss_price, trailing_stop_pct)
+
+                if triggered:
+                    sell_mask |= 1 << kind
+                    bar_hits[kind] = hit_close
+                    if not relation_is_and:
+                        # OR关系：任一策略触发即卖出
+                        break
+                else:
+                    all_triggered = False
+
+            if relation_is_and:
+                should_sell = all_triggered and sell_mask != 0
+            else:
+                should_sell = sell_mask != 0
+
+            if should_sell:
+                if np.isnan(next_open) or next_open <= 0:
+                    event_bars[n_events] = i
+                    event_codes[n_events] = EVENT_SELL_INVALID_OPEN
+                    event_values[n_events] = next_open
+                    n_events += 1
+                    continue
+                if shares <= 0 or np.isnan(shares):
+                    event_bars[n_events] = i
+                    event_codes[n_events] = EVENT_SELL_INVALID_SHARES
+                    event_values[n_events] = shares
+                    n_events += 1
+                    continue
+
+                cash = shares * next_open
+                sell_bars[n_sells] = i + 1
+                sell_prices[n_sells] = next_open
+                sell_shares[n_sells] = shares
+                sell_amounts[n_sells] = cash
+                sell_masks[n_sells] = sell_mask
+                sell_hits[n_sells, :] = bar_hits
+                n_sells += 1
+
+                shares = 0.0
+                position = False
+                buy_date_idx = -1
+
+                # 重置所有策略状态
+                sl_last_check_idx = -1
+                tp_last_check_idx = -1
+                ts_last_check_idx = -1
+                ts_highest_price = 0.0
+                ts_stop_loss_price = 0.0
+                ma_crossed = False
+                ma_crossed_idx = -1
+                ma_below_days = 0
+                ma_last_check_idx = -1
+                ma_profit_reached = False
+
+    return (buy_bars[:n_buys], buy_prices[:n_buys], buy_shares[:n_buys], buy_amounts[:n_buys],
+            sell_bars[:n_sells], sell_prices[:n_sells], sell_shares[:n_sells], sell_amounts[:n_sells],
+            sell_masks[:n_sells], sell_hits[:n_sells], event_bars[:n_events], event_codes[:n_events],
+            event_values[:n_events], cash, shares, position, buy_price)
+
+
+class _TradeRecords:
+    """
+    回测交易记录（按列存储）
+
+    买入/卖出所在K线位置、价格、股数、金额分别存放在预分配的numpy数组中，
+    避免每笔交易创建一个字典；交易日期即对应K线的日期。
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: 最多可记录的交易笔数
+        """
+        self.buy_bars = np.empty(capacity, dtype=np.int64)
+        self.buy_prices = np.empty(capacity, dtype=np.float64)
+        self.buy_shares = np.empty(capacity, dtype=np.float64)
+        self.buy_amounts = np.empty(capacity, dtype=np.float64)
+        self.sell_bars = np.empty(capacity, dtype=np.int64)
+        self.sell_prices = np.empty(capacity, dtype=np.float64)
+        self.sell_shares = np.empty(capacity, dtype=np.float64)
+        self.sell_amounts = np.empty(capacity, dtype=np.float64)
+        self.sell_reasons = []
+        self.buy_count = 0
+        self.sell_count = 0
+
+    @classmethod
+    def for_bars(cls, bar_count: int) -> '_TradeRecords':
+        """
+        按K线数量创建交易记录：每笔买入和卖出至少间隔一条K线，另预留期末结算的一笔
+        """
+        return cls(bar_count // 2 + 2)
+
+    def add_buy(self, bar: int, price: float, shares: float, amount: float):
+        """记录一笔买入（bar为成交K线的位置）"""
+        k = self.buy_count
+        self.buy_bars[k] = bar
+        self.buy_prices[k] = price
+        self.buy_shares[k] = shares
+        self.buy_amounts[k] = amount
+        self.buy_count = k + 1
+
+    def add_sell(self, bar: int, price: float, shares: float, amount: float, reason: str = '-'):
+        """记录一笔卖出（bar为成交K线的位置）"""
+        k = self.sell_count
+        self.sell_bars[k] = bar
+        self.sell_prices[k] = price
+        self.sell_shares[k] = shares
+        self.sell_amounts[k] = amount
+        self.sell_reasons.append(reason)
+        self.sell_count = k + 1
+
+
 class BacktestService:
     """回测服务类"""
     
+    @classmethod
+    def _prepare_indicator_data(cls, daily_df: pd.DataFrame, period: str, buy_threshold: float):
+        """
+        将过滤后的日线数据转换为回测周期并计算全部指标
+        
+        Args:
+            daily_df: 按时间范围过滤后的日线数据
+            period: 周期类型（大写），'D'=日线, 'W'=周线, 'M'=月线
+            buy_threshold: 买入信号阈值
+            
+        Returns:
+            (按日期排序的指标DataFrame, None)；数据无效时返回(None, 错误信息字典)
+        """
+        # 如果选择周线或月线，进行周期转换
+        if period != 'D':
+            df = convert_to_period(daily_df, period)
+        else:
+            # 浅拷贝即可：缓存的日线数据已完成日期转换，下面的赋值只会替换副本中的列
+            df = daily_df.copy(deep=False)
+        
+        # 确保date列是datetime类型
+        if 'date' in df.columns and not is_datetime64_any_dtype(df['date']):
+            df['date'] = pd.to_datetime(df['date'])
+        
+        # 如果过滤后没有数据，返回错误
+        if len(df) == 0:
+            return None, {
+                'success': False,
+                'error': '指定时间范围内没有数据',
+                'error_code': 'NO_DATA_IN_RANGE'
+            }
+        
+        # 检查日线数据是否为空
+        if len(daily_df) == 0:
+            return None, {
+                'success': False,
+                'error': '日线数据为空，无法计算20日均线',
+                'error_code': 'NO_DAILY_DATA'
+            }
+        
+        # 数据验证：确保必要的列存在
+        required_columns = ['open', 'high', 'low', 'close']
+        missing_columns = [col for col in required_columns if col not in df.columns]
+        if missing_columns:
+            return None, {
+                'success': False,
+                'error': f'数据文件缺少必需的列: {", ".join(missing_columns)}',
+                'error_code': 'MISSING_COLUMNS'
+            }
+        
+        # 数据验证：确保价格数据有效
+        price_columns = ['open', 'high', 'low', 'close']
+        for col in price_columns:
+            if np.isnan(df[col].to_numpy(dtype=np.float64, copy=False)).all():
+                return None, {
+                    'success': False,
+                    'error': f'列 {col} 的数据全部为NaN，无法进行回测',
+                    'error_code': 'INVALID_PRICE_DATA'
+                }
+        
+        # 创建指标计算器
+        indicator = StockIndicator(n=5, engine='numba')
+        
+        # 计算所有指标
+        try:
+            result_df = indicator.calculate_all(df, buy_threshold=buy_threshold)
+        except ValueError as e:
+            # 处理指标计算中的值错误
+            logger.error(f'指标计算时发生值错误: {str(e)}', exc_info=True)
+            return None, {
+                'success': False,
+                'error': f'指标计算失败: {str(e)}',
+                'error_code': 'INDICATOR_CALCULATION_ERROR'
+            }
+        
+        # 确保数据按日期排序（calculate_all已排序并重建索引，通常无需再次排序）
+        if not result_df['date'].is_monotonic_increasing:
+            result_df = result_df.sort_values('date').reset_index(drop=True)
+        if not is_datetime64_any_dtype(result_df['date']):
+            result_df['date'] = pd.to_datetime(result_df['date'])
+        
+        
+        return result_df, None
+    
     @classmethod
     def calculate_backtest(cls, period: str, initial_amount: float, file_path: str = 'data/159915.xlsx',
                           start_date: str = None, end_date: str = None, stop_loss_percent: float = None,
@@ -62,26 +433,18 @@ class BacktestService:
             包含回测结果的字典
         """
         try:
-            # 周期名称映射
+            # 周期名称映射（周期字符串只转换一次）
+            period_upper = period.upper()
             period_names = {'D': '日线', 'W': '周线', 'M': '月线'}
-            period_name = period_names.get(period.upper(), period)
+            period_name = period_names.get(period_upper, period)
             
-            # 获取日线数据（使用表格中的MA.MA3作为20日均线）
-            daily_df = IndicatorService.get_daily_data(file_path)
+            # 获取日线数据（已按日期排序，使用表格中的MA.MA3作为20日均线）
+            full_daily_df = IndicatorService.get_daily_data(file_path)
+            daily_df = full_daily_df
             
-            # 确保日线数据按日期排序
+            # 按时间范围过滤日线数据
             if 'date' in daily_df.columns:
-                daily_df['date'] = pd.to_datetime(daily_df['date'])
-                daily_df = daily_df.sort_values('date').reset_index(drop=True)
-                
-                # 按时间范围过滤日线数据
-                if start_date:
-                    start_dt = pd.to_datetime(start_date)
-                    daily_df = daily_df[daily_df['date'] >= start_dt]
-                
-                if end_date:
-                    end_dt = pd.to_datetime(end_date)
-                    daily_df = daily_df[daily_df['date'] <= end_dt]
+                daily_df = IndicatorService.filter_by_date_range(daily_df, start_date, end_date)
             
             # 使用表格中的MA.MA3作为20日均线（完全使用表格中的值，不计算）
             if 'ma20' not in daily_df.columns:
@@ -92,7 +455,7 @@ class BacktestService:
                 }
             
             # 检查ma20列是否有有效值
-            if daily_df['ma20'].notna().sum() == 0:
+            if np.isnan(daily_df['ma20'].to_numpy(dtype=np.float64, copy=False)).all():
                 return {
                     'success': False,
                     'error': '数据文件中的MA.MA3列（20日均线）没有有效值，请检查数据文件',
@@ -103,73 +466,14 @@ class BacktestService:
             # 对于NaN值，保持NaN，在后续使用时会跳过这些行
             
             
-            # 创建日期到索引的映射（用于快速查找）
-            daily_date_to_idx = {date: idx for idx, date in enumerate(daily_df['date'])}
-            
-            # 如果选择周线或月线，进行周期转换
-            if period.upper() != 'D':
-                df = convert_to_period(daily_df, period.upper())
-            else:
-                df = daily_df.copy()
-            
-            # 确保date列是datetime类型
-            if 'date' in df.columns:
-                df['date'] = pd.to_datetime(df['date'])
-            
-            # 如果过滤后没有数据，返回错误
-            if len(df) == 0:
-                return {
-                    'success': False,
-                    'error': '指定时间范围内没有数据',
-                    'error_code': 'NO_DATA_IN_RANGE'
-                }
-            
-            # 检查日线数据是否为空
-            if len(daily_df) == 0:
-                return {
-                    'success': False,
-                    'error': '日线数据为空，无法计算20日均线',
-                    'error_code': 'NO_DAILY_DATA'
-                }
-            
-            # 数据验证：确保必要的列存在
-            required_columns = ['open', 'high', 'low', 'close']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                return {
-                    'success': False,
-                    'error': f'数据文件缺少必需的列: {", ".join(missing_columns)}',
-                    'error_code': 'MISSING_COLUMNS'
-                }
-            
-            # 数据验证：确保价格数据有效
-            price_columns = ['open', 'high', 'low', 'close']
-            for col in price_columns:
-                if df[col].isna().all():
-                    return {
-                        'success': False,
-                        'error': f'列 {col} 的数据全部为NaN，无法进行回测',
-                        'error_code': 'INVALID_PRICE_DATA'
-                    }
-            
-            # 创建指标计算器
-            indicator = StockIndicator(n=5)
-            
-            # 计算所有指标
-            try:
-                result_df = indicator.calculate_all(df.copy(), buy_threshold=buy_threshold)
-            except ValueError as e:
-                # 处理指标计算中的值错误
-                logger.error(f'指标计算时发生值错误: {str(e)}', exc_info=True)
-                return {
-                    'success': False,
-                    'error': f'指标计算失败: {str(e)}',
-                    'error_code': 'INDICATOR_CALCULATION_ERROR'
-                }
-            
-            # 确保数据按日期排序
-            result_df = result_df.sort_values('date').reset_index(drop=True)
-            result_df['date'] = pd.to_datetime(result_df['date'])
+            # 数据文件、周期、时间范围和买入阈值相同时复用指标结果（只调整卖出策略参数时无需重新计算）
+            indicator_key = (file_path, period_upper, start_date, end_date, buy_threshold)
+            result_df = IndicatorService.get_cached_indicators(indicator_key, full_daily_df)
+            if result_df is None:
+                result_df, error = cls._prepare_indicator_data(daily_df, period_upper, buy_threshold)
+                if error is not None:
+                    return error
+                IndicatorService.cache_indicators(indicator_key, full_daily_df, result_df)
             
             # 检查数据是否足够
             if len(result_df) < 2:
@@ -179,6 +483,11 @@ class BacktestService:
                     'error_code': 'INSUFFICIENT_DATA'
                 }
             
+            # 缓存首尾数据，避免结算时反复通过iloc构造行数据
+            first_date = result_df['date'].iat[0]
+            last_date = result_df['date'].iat[-1]
+            last_close = float(result_df['close'].iat[-1])
+            
             # 初始化卖出策略列表（如果未提供，默认全选）
             if sell_strategies is None:
                 active_strategy_names = ['stop_loss', 'take_profit', 'below_ma20']
@@ -207,268 +516,36 @@ class BacktestService:
                     'error_code': 'NO_SELL_STRATEGY'
                 }
             
-            # 回测逻辑：新的买入卖出规则（优化版本）
-            # 使用向量化操作和预计算数据加速
-            cash = initial_amount  # 现金
-            shares = 0  # 持仓数量
-            position = False  # 是否持仓
-            buy_trades = []  # 买入交易记录
-            sell_trades = []  # 卖出交易记录
-            buy_price = 0  # 买入价格（用于止损计算）
-            buy_date_idx = -1  # 买入日期在日线数据中的索引
-            buy_below_ma20 = False  # 买入时收盘价是否在20均线下方（只有这种情况才触发上穿策略）
-            last_checked_daily_idx = -1  # 上次检查的日线数据索引
-            
-            # 将DataFrame转换为numpy数组以提高访问速度
-            result_dates = result_df['date'].values
-            result_buy_signals = result_df['买'].values
-            result_opens = result_df['open'].values
-            result_closes = result_df['close'].values
-            
-            daily_dates = daily_df['date'].values
-            daily_ma20 = daily_df['ma20'].values
-            daily_closes = daily_df['close'].values
-            
-            # 遍历数据，模拟交易
-            for i in range(len(result_df) - 1):  # 最后一条数据不能买入，因为没有下一条数据
-                current_date = result_dates[i]
-                next_date = result_dates[i + 1]
-                current_buy_signal = result_buy_signals[i]
-                next_open = result_opens[i + 1]
-                current_close = result_closes[i]
-                next_close = result_closes[i + 1]
-                
-                # 快速获取当前日期对应的日线数据索引
-                current_daily_idx = -1
-                current_ma20_val = None
-                
-                if period.upper() == 'D':
-                    # 日线：直接使用日期映射
-                    current_daily_idx = daily_date_to_idx.get(current_date, -1)
-                else:
-                    # 周线/月线：从上次位置开始查找
-                    start_idx = max(0, last_checked_daily_idx) if last_checked_daily_idx >= 0 else 0
-                    # 使用numpy的searchsorted加速查找
-                    insert_pos = np.searchsorted(daily_dates[start_idx:], current_date, side='right')
-                    if insert_pos > 0:
-                        current_daily_idx = start_idx + insert_pos - 1
-                    elif start_idx > 0:
-                        current_daily_idx = start_idx - 1
-                
-                if current_daily_idx >= 0 and current_daily_idx < len(daily_df):
-                    current_ma20_val = daily_ma20[current_daily_idx]
-                    last_checked_daily_idx = current_daily_idx
-                
-                # 买入信号：CROSS(趋势线,buy_threshold) - 趋势线从下向上穿越buy_threshold
-                if current_buy_signal == 1 and not position:
-                    # 验证下一天的开盘价是否有效
-                    if pd.isna(next_open) or next_open <= 0:
-                        # 如果下一天开盘价无效，跳过此次买入信号
-                        logger.warning(f'日期 {current_date} 的买入信号被跳过：下一天开盘价无效 (next_open={next_open})')
-                        continue
-                    
-                    # 验证现金是否足够（虽然全仓买入，但需要确保有现金）
-                    if cash <= 0:
-                        logger.warning(f'日期 {current_date} 的买入信号被跳过：现金不足 (cash={cash})')
-                        continue
-                    
-                    # 第二天开盘价买入
-                    buy_price = float(next_open)
-                    buy_amount = cash  # 使用当前现金全仓买入
-                    
-                    # 计算买入股数，确保不会因为价格问题导致除零或负数
-                    if buy_price > 0:
-                        shares = buy_amount / buy_price
-                    else:
-                        logger.error(f'日期 {current_date} 的买入信号被跳过：买入价格无效 (buy_price={buy_price})')
-                        continue
-                    
-                    # 验证买入股数是否有效
-                    if shares <= 0 or pd.isna(shares):
-                        logger.error(f'日期 {current_date} 的买入信号被跳过：买入股数无效 (shares={shares})')
-                        continue
-                    
-                    cash = 0
-                    position = True
-                    
-                    # 买入日期索引（用于后续20日均线检查）
-                    buy_date_idx = -1
-                    if period.upper() == 'D':
-                        buy_date_idx = daily_date_to_idx.get(next_date, -1)
-                    else:
-                        # 周线/月线：找到对应的日线索引
-                        # 使用numpy的searchsorted加速查找
-                        insert_pos = np.searchsorted(daily_dates, next_date, side='right')
-                        if insert_pos > 0:
-                            buy_date_idx = insert_pos - 1
-                        else:
-                            # 如果找不到，尝试查找最接近的日期（向前查找）
-                            buy_date_idx = -1
-                    
-                    # 如果找不到买入日期索引，记录警告但继续执行
-                    if buy_date_idx < 0:
-                        logger.warning(f'无法找到买入日期 {next_date} 对应的日线索引，20均线策略可能无法正常工作')
-                    
-                    # 检查买入时收盘价是否在20均线下方（只有这种情况才触发上穿策略）
-                    buy_below_ma20 = False
-                    if buy_date_idx >= 0 and buy_date_idx < len(daily_df):
-                        buy_day_close = daily_closes[buy_date_idx] if buy_date_idx < len(daily_closes) else None
-                        buy_day_ma20 = daily_ma20[buy_date_idx] if buy_date_idx < len(daily_ma20) else None
-                        # 如果买入时收盘价在20均线下方，才启用上穿策略
-                        if pd.notna(buy_day_close) and pd.notna(buy_day_ma20):
-                            buy_below_ma20 = buy_day_close < buy_day_ma20
-                    
-                    last_checked_daily_idx = current_daily_idx if current_daily_idx >= 0 else -1
-                    
-                    # 重置所有策略状态并设置买入信息
-                    for strategy in strategy_instances:
-                        try:
-                            strategy.reset()
-                            # 为需要买入信息的策略设置信息
-                            strategy_name = strategy.get_name()
-                            if strategy_name == 'below_ma20':
-                                strategy.set_buy_info(buy_date_idx, buy_below_ma20)
-                            elif strategy_name == 'trailing_stop_loss':
-                                strategy.set_buy_info(buy_price, buy_date_idx)
-                            elif strategy_name == 'stop_loss':
-                                strategy.set_buy_info(buy_date_idx)
-                            elif strategy_name == 'take_profit':
-                                strategy.set_buy_info(buy_date_idx)
-                        except Exception as e:
-                            logger.warning(f'设置策略 {strategy_name} 买入信息时发生错误: {str(e)}', exc_info=True)
-                            # 继续执行，不中断回测流程
-                    
-                    buy_trades.append({
-                        'date': pd.Timestamp(next_date).strftime('%Y-%m-%d'),
-                        'price': format_decimal(buy_price),
-                        'shares': format_decimal(shares),
-                        'amount': format_decimal(buy_amount)
-                    })
-                
-                # 卖出逻辑（仅在持仓时执行）
-                elif position:
-                    should_sell = False
-                    sell_reason = ''
-                    
-                    # 构建策略上下文
-                    strategy_context = {
-                        'position': position,
-                        'current_close': current_close,
-                        'buy_price': buy_price,
-                        'buy_date_idx': buy_date_idx,
-                        'current_daily_idx': current_daily_idx,
-                        'daily_df': daily_df,
-                        'daily_closes': daily_closes,
-                        'daily_ma20': daily_ma20,
-                        'result_df': result_df,
-                        'period': period
-                    }
-                    
-                    # 根据策略关系（AND/OR）判断是否卖出
-                    if strategy_relation.upper() == 'AND':
-                        # AND关系：所有策略都必须触发才卖出
-                        triggered_strategies = []
-                        all_triggered = True
-                        
-                        for strategy in strategy_instances:
-                            try:
-                                sell, reason = strategy.should_sell(strategy_context)
-                                if sell:
-                                    triggered_strategies.append(reason)
-                                else:
-                                    all_triggered = False
-                            except Exception as e:
-                                logger.warning(f'策略 {strategy.get_name()} 判断卖出时发生错误: {str(e)}', exc_info=True)
-                                # 如果策略出错，在AND模式下视为未触发
-                                all_triggered = False
-                        
-                        if all_triggered and len(triggered_strategies) > 0:
-                            should_sell = True
-                            sell_reason = ' & '.join(triggered_strategies)  # 组合所有触发的原因
-                    else:
-                        # OR关系（默认）：任一策略触发即卖出
-                        for strategy in strategy_instances:
-                            try:
-                                sell, reason = strategy.should_sell(strategy_context)
-                                if sell:
-                                    should_sell = True
-                                    sell_reason = reason
-                                    break  # 任一策略触发卖出即执行
-                            except Exception as e:
-                                logger.warning(f'策略 {strategy.get_name()} 判断卖出时发生错误: {str(e)}', exc_info=True)
-                                # 如果策略出错，在OR模式下继续检查其他策略
-                                continue
-                    
-                    # 执行卖出
-                    if should_sell:
-                        # 验证下一天的开盘价是否有效
-                        if pd.isna(next_open) or next_open <= 0:
-                            logger.warning(f'日期 {current_date} 的卖出信号被跳过：下一天开盘价无效 (next_open={next_open})')
-                            continue
-                        
-                        # 验证持仓数量是否有效
-                        if shares <= 0 or pd.isna(shares):
-                            logger.warning(f'日期 {current_date} 的卖出信号被跳过：持仓数量无效 (shares={shares})')
-                            continue
-                        
-                        # 第二天开盘价卖出
-                        sell_price = float(next_open)
-                        cash = shares * sell_price  # 全仓卖出
-                        buy_amount = buy_trades[-1]['amount'] if buy_trades else initial_amount
-                        profit = cash - buy_amount
-                        profit_rate = (profit / buy_amount * 100) if buy_amount > 0 else 0
-                        
-                        sell_trades.append({
-                            'date': pd.Timestamp(next_date).strftime('%Y-%m-%d'),
-                            'price': format_decimal(sell_price),
-                            'shares': format_decimal(shares),
-                            'amount': format_decimal(cash),
-                            'profit': format_decimal(profit),
-                            'profit_rate': format_decimal(profit_rate),
-                            'reason': sell_reason
-                        })
-                        shares = 0
-                        position = False
-                        buy_below_ma20 = False
-                        last_checked_daily_idx = -1
-                        buy_date_idx = -1
-                        
-                        # 重置所有策略状态
-                        for strategy in strategy_instances:
-                            try:
-                                strategy.reset()
-                            except Exception as e:
-                                logger.warning(f'重置策略 {strategy.get_name()} 状态时发生错误: {str(e)}', exc_info=True)
-                                # 继续执行，不中断回测流程
+            # 回测逻辑：内置策略走JIT编译的回测循环；未安装numba时，OR关系的内置策略
+            # 使用向量化的卖出点查找；其余情况使用策略对象逐K线判断
+            if cls._can_use_jit_loop(strategy_instances):
+                trades, cash, shares, position, buy_price = cls._run_jit_loop(
+                    result_df, daily_df, period, strategy_instances, strategy_relation, initial_amount)
+            elif cls._can_use_vectorized_loop(strategy_instances, strategy_relation):
+                trades, cash, shares, position, buy_price = cls._run_vectorized_loop(
+                    result_df, daily_df, period, strategy_instances, initial_amount)
+            else:
+                trades, cash, shares, position, buy_price = cls._run_strategy_loop(
+                    result_df, daily_df, period, strategy_instances, strategy_relation, initial_amount)
             
             # 如果最后还有持仓，按最后一天收盘价计算
-            if position and len(result_df) > 0 and len(buy_trades) > 0:
-                last_price = result_df.iloc[-1]['close']
+            settlement_skipped = False
+            if position and len(result_df) > 0 and trades.buy_count > 0:
+                last_price = last_close
                 
                 # 验证最后一天收盘价是否有效
-                if pd.isna(last_price) or last_price <= 0:
+                if math.isnan(last_price) or last_price <= 0:
                     logger.warning(f'最后一天收盘价无效 (last_price={last_price})，使用买入价格计算')
-                    last_price = buy_price if buy_price > 0 else buy_trades[-1]['price']
+                    last_price = buy_price if buy_price > 0 else format_decimal(trades.buy_prices[trades.buy_count - 1])
                 
                 # 验证持仓数量是否有效
-                if shares > 0 and not pd.isna(shares):
+                if shares > 0 and not math.isnan(shares):
                     cash = shares * float(last_price)
-                    buy_amount = buy_trades[-1]['amount']
-                    profit = cash - buy_amount
-                    profit_rate = (profit / buy_amount) * 100 if buy_amount > 0 else 0
                 else:
                     logger.warning(f'最后持仓数量无效 (shares={shares})，跳过最终结算')
                     cash = 0
-                    profit = 0
-                    profit_rate = 0
-                sell_trades.append({
-                    'date': result_df.iloc[-1]['date'].strftime('%Y-%m-%d'),
-                    'price': format_decimal(last_price),
-                    'shares': format_decimal(shares),
-                    'amount': format_decimal(cash),
-                    'profit': format_decimal(profit),
-                    'profit_rate': format_decimal(profit_rate)
-                })
+                    settlement_skipped = True
+                trades.add_sell(len(result_df) - 1, last_price, shares, cash)
             
             # 计算总收益
             final_amount = cash
@@ -476,34 +553,53 @@ class BacktestService:
             total_profit_rate = (total_profit / initial_amount) * 100 if initial_amount > 0 else 0
             
             # 计算年收益率
-            start_date = result_df.iloc[0]['date']
-            end_date = result_df.iloc[-1]['date']
+            start_date = first_date
+            end_date = last_date
             days = (end_date - start_date).days
             years = days / 365.25  # 考虑闰年
             annual_profit_rate = ((final_amount / initial_amount) ** (1 / years) - 1) * 100 if years > 0 and initial_amount > 0 else 0
             
-            # 配对买卖交易
+            # 配对买卖交易：按列计算每笔交易的收益（买入金额按展示精度保留3位小数后参与计算）
+            trade_count = min(trades.buy_count, trades.sell_count)
+            buy_amounts = format_decimal_array(trades.buy_amounts[:trade_count])
+            profits = trades.sell_amounts[:trade_count] - buy_amounts
+            with np.errstate(divide='ignore', invalid='ignore'):
+                profit_rates = np.where(buy_amounts > 0, profits / buy_amounts * 100, 0.0)
+            if settlement_skipped:
+                # 期末持仓数量无效时不计算最后一笔的收益
+                profits[-1] = 0
+                profit_rates[-1] = 0
+            
+            # 按卖出日期倒序排列（最新的交易在前）：K线位置与日期同序，直接对卖出K线位置排序，
+            # 无需比较日期字符串
+            order = np.argsort(-trades.sell_bars[:trade_count], kind='stable')
+            
+            # 数值列整体格式化，最后一次性转换为列表
+            buy_prices = to_json_list(format_decimal_array(trades.buy_prices[:trade_count][order]))
+            sell_prices = to_json_list(format_decimal_array(trades.sell_prices[:trade_count][order]))
+            buy_shares = to_json_list(format_decimal_array(trades.buy_shares[:trade_count][order]))
+            profits = to_json_list(format_decimal_array(profits[order]))
+            profit_rates = to_json_list(format_decimal_array(profit_rates[order]))
+            
+            result_dates = result_df['date'].to_numpy()
+            buy_dates = format_date_list(result_dates[trades.buy_bars[:trade_count][order]])
+            sell_dates = format_date_list(result_dates[trades.sell_bars[:trade_count][order]])
             trade_pairs = []
-            for i in range(min(len(buy_trades), len(sell_trades))):
-                buy_trade = buy_trades[i]
-                sell_trade = sell_trades[i]
+            for k, i in enumerate(order):
                 trade_pairs.append({
-                    'buy_date': buy_trade['date'],
-                    'buy_price': format_decimal(buy_trade['price']),
-                    'sell_date': sell_trade['date'],
-                    'sell_price': format_decimal(sell_trade['price']),
-                    'shares': format_decimal(buy_trade['shares']),
-                    'profit': format_decimal(sell_trade['profit']),
-                    'profit_rate': format_decimal(sell_trade['profit_rate']),
-                    'reason': sell_trade.get('reason', '-')  # 获取卖出原因，如果没有则使用 '-'
+                    'buy_date': buy_dates[k],
+                    'buy_price': buy_prices[k],
+                    'sell_date': sell_dates[k],
+                    'sell_price': sell_prices[k],
+                    'shares': buy_shares[k],
+                    'profit': profits[k],
+                    'profit_rate': profit_rates[k],
+                    'reason': trades.sell_reasons[i]
                 })
             
-            # 按卖出日期倒序排序（最新的交易在前）
-            trade_pairs.sort(key=lambda x: x['sell_date'], reverse=True)
-            
             return {
                 'success': True,
-                'period': period.upper(),
+                'period': period_upper,
                 'period_name': period_name,
                 'initial_amount': format_decimal(initial_amount),
                 'final_amount': format_decimal(final_amount),
@@ -533,6 +629,604 @@ class BacktestService:
                 'error_code': 'BACKTEST_ERROR'
             }
 
+    @classmethod
+    def calculate_backtest_batch(cls, configs: List[dict], max_workers: int = None) -> List[dict]:
+        """
+        批量计算回测结果（多进程并行，适用于多标的或多组参数的回测）
+        
+        Args:
+            configs: 回测参数列表，每一项为传给calculate_backtest的关键字参数字典
+            max_workers: 最大进程数，默认使用CPU核数
+            
+        Returns:
+            与configs顺序一致的回测结果列表
+        """
+        if not configs:
+            return []
+        
+        max_workers = min(max_workers or os.cpu_count() or 1, len(configs))
+        if max_workers <= 1:
+            return [cls.calculate_backtest(**config) for config in configs]
+        
+        # 先在主进程中加载所有数据文件，子进程（fork方式启动时）直接继承缓存，无需各自重复读取
+        for file_path in dict.fromkeys(config.get('file_path', 'data/159915.xlsx') for config in configs):
+            try:
+                IndicatorService.get_daily_data(file_path)
+            except Exception as e:
+                # 加载失败的文件交给子进程按单次回测的方式返回错误信息
+                logger.warning(f'预加载数据文件 {file_path} 失败: {str(e)}')
+        
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_calculate_backtest_worker, configs))
+
+    @classmethod
+    def _can_use_jit_loop(cls, strategy_instances: List[SellStrategy]) -> bool:
+        """
+        判断是否可以使用JIT编译的回测循环
+
+        需要已安装numba，且所有策略都是不重复的内置策略
+        """
+        if not NUMBA_AVAILABLE:
+            return False
+        return cls._has_unique_builtin_strategies(strategy_instances)
+
+    @staticmethod
+    def _has_unique_builtin_strategies(strategy_instances: List[SellStrategy]) -> bool:
+        """
+        判断策略列表是否全部为内置策略且类型不重复
+        """
+        kinds = [strategy.KIND for strategy in strategy_instances]
+        return all(0 <= kind < BUILTIN_STRATEGY_COUNT for kind in kinds) and len(set(kinds)) == len(kinds)
+
+    @classmethod
+    def _run_jit_loop(cls, result_df, daily_df, period: str, strategy_instances: List[SellStrategy],
+                      strategy_relation: str, initial_amount: float):
+        """
+        使用JIT编译的回测循环模拟交易（仅支持内置卖出策略）
+
+        Returns:
+            (交易记录, 现金, 持仓数量, 是否持仓, 买入价格)
+        """
+        strategies_by_kind = [None] * BUILTIN_STRATEGY_COUNT
+        for strategy in strategy_instances:
+            strategies_by_kind[strategy.KIND] = strategy
+        strategy_kinds = np.array([strategy.KIND for strategy in strategy_instances], dtype=np.int64)
+
+        # 策略参数，未启用或未设置的参数用NaN表示
+        stop_loss = strategies_by_kind[STRATEGY_STOP_LOSS]
+        take_profit = strategies_by_kind[STRATEGY_TAKE_PROFIT]
+        below_ma20 = strategies_by_kind[STRATEGY_BELOW_MA20]
+        trailing_stop = strategies_by_kind[STRATEGY_TRAILING_STOP]
+        stop_loss_pct = float(stop_loss.stop_loss_percent) if stop_loss is not None else np.nan
+        take_profit_pct = np.nan
+        if take_profit is not None and take_profit.take_profit_percent is not None:
+            take_profit_pct = float(take_profit.take_profit_percent)
+        below_ma20_days = 0
+        below_ma20_min_profit = np.nan
+        if below_ma20 is not None:
+            below_ma20_days = int(below_ma20.below_ma20_days)
+            if below_ma20.min_profit_percent is not None:
+                below_ma20_min_profit = float(below_ma20.min_profit_percent)
+        trailing_stop_pct = np.nan
+        if trailing_stop is not None:
+            trailing_stop_pct = float(trailing_stop.trailing_stop_percent)
+
+        result_dates = result_df['date'].to_numpy(copy=False)
+        result_to_daily_idx, next_to_daily_idx = cls._map_to_daily_idx(result_df, daily_df, period)
+        (buy_bars, buy_prices, buy_shares, buy_amounts,
+         sell_bars, sell_prices, sell_shares, sell_amounts, sell_masks, sell_hits,
+         event_bars, event_codes, event_values, cash, shares, position, buy_price) = _run_backtest_loop(
+            result_to_daily_idx,
+            next_to_daily_idx,
+            result_df['买'].to_numpy(dtype=np.int64),
+            result_df['open'].to_numpy(dtype=np.float64, copy=False),
+            daily_df['ma20'].to_numpy(dtype=np.float64, copy=False),
+            daily_df['close'].to_numpy(dtype=np.float64, copy=False),
+            strategy_kinds, stop_loss_pct, take_profit_pct, below_ma20_days, below_ma20_min_profit,
+            trailing_stop_pct, strategy_relation.upper() == 'AND', float(initial_amount)
+        )
+
+        for bar, code, value in zip(event_bars, event_codes, event_values):
+            current_date = result_dates[bar]
+            if code == EVENT_BUY_INVALID_OPEN:
+                logger.warning(f'日期 {current_date} 的买入信号被跳过：下一天开盘价无效 (next_open={value})')
+            elif code == EVENT_BUY_NO_CASH:
+                logger.warning(f'日期 {current_date} 的买入信号被跳过：现金不足 (cash={value})')
+            elif code == EVENT_BUY_INVALID_SHARES:
+                logger.error(f'日期 {current_date} 的买入信号被跳过：买入股数无效 (shares={value})')
+            elif code == EVENT_BUY_NO_DAILY_IDX:
+                logger.warning(f'无法找到买入日期 {result_dates[bar + 1]} 对应的日线索引，20均线策略可能无法正常工作')
+            elif code == EVENT_SELL_INVALID_OPEN:
+                logger.warning(f'日期 {current_date} 的卖出信号被跳过：下一天开盘价无效 (next_open={value})')
+            elif code == EVENT_SELL_INVALID_SHARES:
+                logger.warning(f'日期 {current_date} 的卖出信号被跳过：持仓数量无效 (shares={value})')
+
+        trades = _TradeRecords.for_bars(len(result_df))
+        for j in range(len(buy_bars)):
+            trades.add_buy(buy_bars[j], buy_prices[j], buy_shares[j], buy_amounts[j])
+        for j in range(len(sell_bars)):
+            trade_buy_price = float(buy_prices[j])
+            reasons = [
+                cls._format_sell_reason(strategy, float(sell_hits[j, strategy.KIND]), trade_buy_price)
+                for strategy in strategy_instances if sell_masks[j] & (1 << strategy.KIND)
+            ]
+            trades.add_sell(sell_bars[j], sell_prices[j], sell_shares[j], sell_amounts[j], ' & '.join(reasons))
+
+        return trades, float(cash), float(shares), bool(position), float(buy_price)
+
+    @classmethod
+    def _can_use_vectorized_loop(cls, strategy_instances: List[SellStrategy], strategy_relation: str) -> bool:
+        """
+        判断是否可以使用向量化的卖出点查找
+
+        仅支持OR关系下不重复的内置策略（AND关系需要逐K线比对各策略的触发状态）
+        """
+        if strategy_relation.upper() == 'AND':
+            return False
+        return cls._has_unique_builtin_strategies(strategy_instances)
+
+    @classmethod
+    def _position_trigger_days(cls, strategy_instances: List[SellStrategy], daily_closes, daily_ma20,
+                               buy_price: float, buy_date_idx: int, buy_below_ma20: bool, end_idx: int):
+        """
+        一次性计算各内置策略在一次持仓期间会触发卖出的全部日线索引（逻辑与各策略的should_sell一致）
+
+        这些策略的触发条件只依赖买入信息和日线数据，与逐K线检查的分段方式无关，
+        因此可以对买入后到end_idx的日线数据整体做向量化判断。
+        止损/止盈/追踪止损共用同一段收盘价切片及其有效性、收益率数组，每次持仓只遍历一遍。
+
+        Returns:
+            与strategy_instances顺序一致的触发日线索引数组列表（均为升序）
+        """
+        no_trigger = np.empty(0, dtype=np.int64)
+        start_idx = buy_date_idx + 1
+        if buy_date_idx < 0 or start_idx > end_idx:
+            return [no_trigger] * len(strategy_instances)
+
+        closes = daily_closes[start_idx:end_idx + 1]
+        valid = ~np.isnan(closes) & (closes > 0)
+        profit_percent = None
+
+        trigger_days = []
+        for strategy in strategy_instances:
+            kind = strategy.KIND
+            if kind == STRATEGY_BELOW_MA20:
+                trigger_days.append(cls._below_ma20_trigger_days(strategy, daily_closes, daily_ma20, buy_price,
+                                                                 start_idx, buy_below_ma20, end_idx))
+                continue
+
+            if kind == STRATEGY_TRAILING_STOP:
+                # 止损价始终为买入后最高收盘价（不低于买入价）下方trailing_stop_percent%
+                highest_price = np.maximum(np.maximum.accumulate(np.where(valid, closes, buy_price)), buy_price)
+                stop_loss_price = highest_price * (1 - strategy.trailing_stop_percent / 100)
+                triggered = valid & (closes < stop_loss_price)
+            elif kind == STRATEGY_TAKE_PROFIT and strategy.take_profit_percent is None:
+                trigger_days.append(no_trigger)
+                continue
+            else:
+                if profit_percent is None:
+                    profit_percent = (closes - buy_price) / buy_price * 100
+                if kind == STRATEGY_STOP_LOSS:
+                    triggered = valid & (profit_percent <= -strategy.stop_loss_percent)
+                else:
+                    triggered = valid & (profit_percent >= strategy.take_profit_percent)
+            trigger_days.append(start_idx + np.flatnonzero(triggered))
+        return trigger_days
+
+    @staticmethod
+    def _below_ma20_trigger_days(strategy: SellStrategy, daily_closes, daily_ma20, buy_price: float,
+                                 start_idx: int, buy_below_ma20: bool, end_idx: int):
+        """
+        计算20均线下方策略在一次持仓期间的全部触发日线索引（start_idx为买入日期的下一天）
+
+        Returns:
+            升序排列的触发日线索引数组
+        """
+        no_trigger = np.empty(0, dtype=np.int64)
+        if not buy_below_ma20:
+            return no_trigger
+
+        # 第一步：买入后首次上穿20均线的日期（前一日收盘价<=20均线，当日收盘价>20均线）
+        cross_start_idx = max(start_idx, 1)
+        if cross_start_idx > end_idx:
+            return no_trigger
+        crossed = ((daily_closes[cross_start_idx - 1:end_idx] <= daily_ma20[cross_start_idx - 1:end_idx]) &
+                   (daily_closes[cross_start_idx:end_idx + 1] > daily_ma20[cross_start_idx:end_idx + 1]))
+        if not crossed.any():
+            return no_trigger
+        crossed_idx = cross_start_idx + int(np.argmax(crossed))
+
+        # 第二步：上穿后收盘价在20均线下方的连续天数（NaN及未达到收益阈值的日期不参与计数）
+        closes = daily_closes[crossed_idx + 1:end_idx + 1]
+        ma20 = daily_ma20[crossed_idx + 1:end_idx + 1]
+        counted = ~np.isnan(closes) & ~np.isnan(ma20)
+        if strategy.min_profit_percent is not None:
+            profit_percent = (closes - buy_price) / buy_price * 100
+            counted &= np.logical_or.accumulate(counted & (profit_percent >= strategy.min_profit_percent))
+        counted_pos = np.flatnonzero(counted)
+        below = closes[counted_pos] < ma20[counted_pos]
+        below_count = np.cumsum(below)
+        below_days = below_count - np.maximum.accumulate(np.where(below, 0, below_count))
+        return crossed_idx + 1 + counted_pos[below_days >= strategy.below_ma20_days]
 
+    @classmethod
+    def _run_vectorized_loop(cls, result_df, daily_df, period: str, strategy_instances: List[SellStrategy],
+                             initial_amount: float):
+        """
+        使用向量化的卖出点查找模拟交易（仅支持OR关系下的内置卖出策略）
+
+        买入后一次性算出各策略的全部触发日，再用二分查找定位第一个覆盖触发日的K线，
+        直接跳到卖出点，不再逐K线调用各策略。
+
+        Returns:
+            (交易记录, 现金, 持仓数量, 是否持仓, 买入价格)
+        """
+        result_dates = result_df['date'].to_numpy(copy=False)
+        result_opens = result_df['open'].to_numpy(dtype=np.float64, copy=False)
+        daily_closes = daily_df['close'].to_numpy(dtype=np.float64, copy=False)
+        daily_ma20 = daily_df['ma20'].to_numpy(dtype=np.float64, copy=False)
+        result_to_daily_idx, next_to_daily_idx = cls._map_to_daily_idx(result_df, daily_df, period)
+
+        # 可以产生信号的K线（最后一条数据没有下一条数据，不能交易）
+        bar_count = len(result_df) - 1
+        buy_bars = np.flatnonzero(result_df['买'].to_numpy()[:bar_count] == 1)
+        last_daily_idx = min(int(result_to_daily_idx.max()), len(daily_df) - 1) if bar_count > 0 else -1
 
+        cash = initial_amount
+        shares = 0
+        position = False
+        trades = _TradeRecords.for_bars(len(result_df))
+        buy_price = 0
 
+        i = 0
+        while i < bar_count:
+            if not position:
+                # 跳到下一个买入信号
+                pos = np.searchsorted(buy_bars, i)
+                if pos >= len(buy_bars):
+                    break
+                i = int(buy_bars[pos])
+                current_date = result_dates[i]
+                next_date = result_dates[i + 1]
+                next_open = result_opens[i + 1]
+
+                if math.isnan(next_open) or next_open <= 0:
+                    logger.warning(f'日期 {current_date} 的买入信号被跳过：下一天开盘价无效 (next_open={next_open})')
+                    i += 1
+                    continue
+                if cash <= 0:
+                    logger.warning(f'日期 {current_date} 的买入信号被跳过：现金不足 (cash={cash})')
+                    i += 1
+                    continue
+
+                buy_price = float(next_open)
+                buy_amount = cash
+                shares = buy_amount / buy_price
+                if shares <= 0 or math.isnan(shares):
+                    logger.error(f'日期 {current_date} 的买入信号被跳过：买入股数无效 (shares={shares})')
+                    i += 1
+                    continue
+
+                cash = 0
+                position = True
+
+                buy_date_idx = int(next_to_daily_idx[i])
+                if buy_date_idx < 0:
+                    logger.warning(f'无法找到买入日期 {next_date} 对应的日线索引，20均线策略可能无法正常工作')
+
+                buy_below_ma20 = False
+                if 0 <= buy_date_idx < len(daily_df):
+                    buy_day_close = daily_closes[buy_date_idx]
+                    buy_day_ma20 = daily_ma20[buy_date_idx]
+                    if not math.isnan(buy_day_close) and not math.isnan(buy_day_ma20):
+                        buy_below_ma20 = buy_day_close < buy_day_ma20
+
+                # 各策略本次持仓在已扫描区间内的全部触发日，以及下一个待触发的位置
+                # 先只扫描买入后一段日线，区间内没有待触发日时再成倍扩大（持仓通常远短于剩余数据）
+                scan_end_idx = (min(buy_date_idx + VECTORIZED_SCAN_DAYS, last_daily_idx) if buy_date_idx >= 0
+                                else last_daily_idx)
+                trigger_days = cls._position_trigger_days(strategy_instances, daily_closes, daily_ma20, buy_price,
+                                                          buy_date_idx, buy_below_ma20, scan_end_idx)
+                trigger_pos = [0] * len(strategy_instances)
+
+                trades.add_buy(i + 1, buy_price, shares, buy_amount)
+                i += 1
+                continue
+
+            # 持仓中：找到最早覆盖某个策略触发日的K线（同一K线按策略顺序取第一个）
+            while True:
+                sell_bar = bar_count
+                sell_strategy_pos = -1
+                for k, days in enumerate(trigger_days):
+                    if trigger_pos[k] >= len(days):
+                        continue
+                    bar = max(i, int(np.searchsorted(result_to_daily_idx, days[trigger_pos[k]], side='left')))
+                    if bar < sell_bar:
+                        sell_bar = bar
+                        sell_strategy_pos = k
+                # 卖出K线覆盖的日线都已扫描过时，结果才确定（同一K线上区间外的触发日可能属于更靠前的策略）
+                if scan_end_idx >= last_daily_idx or (
+                        sell_strategy_pos >= 0 and result_to_daily_idx[sell_bar] <= scan_end_idx):
+                    break
+                # 扫描区间加倍后重新计算。触发日只依赖当日及之前的数据，
+                # 新结果以原结果为前缀，已消耗的位置trigger_pos仍然有效
+                scan_end_idx = min(buy_date_idx + 2 * (scan_end_idx - buy_date_idx), last_daily_idx)
+                trigger_days = cls._position_trigger_days(strategy_instances, daily_closes, daily_ma20, buy_price,
+                                                          buy_date_idx, buy_below_ma20, scan_end_idx)
+            if sell_strategy_pos < 0:
+                break
+
+            i = sell_bar
+            current_date = result_dates[i]
+            next_open = result_opens[i + 1]
+            hit_idx = trigger_days[sell_strategy_pos][trigger_pos[sell_strategy_pos]]
+            trigger_pos[sell_strategy_pos] += 1
+
+            if math.isnan(next_open) or next_open <= 0:
+                logger.warning(f'日期 {current_date} 的卖出信号被跳过：下一天开盘价无效 (next_open={next_open})')
+                i += 1
+                continue
+            if shares <= 0 or math.isnan(shares):
+                logger.warning(f'日期 {current_date} 的卖出信号被跳过：持仓数量无效 (shares={shares})')
+                i += 1
+                continue
+
+            sell_price = float(next_open)
+            cash = shares * sell_price
+            trades.add_sell(i + 1, sell_price, shares, cash,
+                            cls._format_sell_reason(strategy_instances[sell_strategy_pos],
+                                                    float(daily_closes[hit_idx]), buy_price))
+            shares = 0
+            position = False
+            i += 1
+
+        return trades, cash, shares, position, buy_price
+
+    @staticmethod
+    def _map_to_daily_idx(result_df, daily_df, period: str):
+        """
+        一次性计算每条周期数据（及其下一条数据）对应的日线索引，替代循环内的逐次查找
+
+        日线周期要求日期完全匹配；周线/月线取不晚于该日期的最后一条日线数据。找不到时为-1。
+
+        Returns:
+            (当前日期对应的日线索引数组, 下一条数据日期对应的日线索引数组)，长度均为len(result_df)-1
+        """
+        result_dates = result_df['date'].to_numpy(dtype='datetime64[ns]', copy=False)
+        daily_dates = daily_df['date'].to_numpy(dtype='datetime64[ns]', copy=False)
+
+        # 索引使用int32存储（日线条数远小于2^31），内存占用减半
+        daily_idx = np.searchsorted(daily_dates, result_dates, side='right').astype(np.int32) - 1
+        if period.upper() == 'D':
+            # 日线：日期必须完全一致
+            matched = daily_idx >= 0
+            matched[matched] = daily_dates[daily_idx[matched]] == result_dates[matched]
+            daily_idx[~matched] = -1
+
+        if len(daily_idx) == 0:
+            return daily_idx, daily_idx
+        return daily_idx[:-1], daily_idx[1:]
+
+    @staticmethod
+    def _format_sell_reason(strategy: SellStrategy, hit_close: float, buy_price: float) -> str:
+        """
+        根据触发日收盘价生成卖出原因（由策略的sell_reason生成，文案与should_sell返回值一致）
+        """
+        return strategy.sell_reason(hit_close, buy_price)
+
+    @classmethod
+    def _run_strategy_loop(cls, result_df, daily_df, period: str, strategy_instances: List[SellStrategy],
+                           strategy_relation: str, initial_amount: float):
+        """
+        使用策略对象逐K线模拟交易（通用路径，支持任意SellStrategy）
+        
+        Returns:
+            (交易记录, 现金, 持仓数量, 是否持仓, 买入价格)
+        """
+        cash = initial_amount  # 现金
+        shares = 0  # 持仓数量
+        position = False  # 是否持仓
+        trades = _TradeRecords.for_bars(len(result_df))  # 买入/卖出交易记录
+        buy_price = 0  # 买入价格（用于止损计算）
+        buy_date_idx = -1  # 买入日期在日线数据中的索引
+        buy_below_ma20 = False  # 买入时收盘价是否在20均线下方（只有这种情况才触发上穿策略）
+        relation_is_and = strategy_relation.upper() == 'AND'  # 策略关系在整个回测中不变，循环外判断一次
+        
+        # 将DataFrame转换为连续的numpy数组以提高访问速度（循环内使用math.isnan，避免pandas的NaN判断开销）
+        result_dates = result_df['date'].to_numpy(copy=False)
+        result_buy_signals = result_df['买'].to_numpy(copy=False)
+        result_opens = result_df['open'].to_numpy(dtype=np.float64, copy=False)
+        result_closes = result_df['close'].to_numpy(dtype=np.float64, copy=False)
+        
+        # 卖出策略要求日线数组为C连续的float64 ndarray，构建上下文时统一转换一次
+        # 注意：不能降为float32，收盘价/20均线的舍入误差会改变止损、止盈及均线比较恰好落在边界上的结果
+        daily_ma20 = np.ascontiguousarray(daily_df['ma20'].to_numpy(dtype=np.float64, copy=False))
+        daily_closes = np.ascontiguousarray(daily_df['close'].to_numpy(dtype=np.float64, copy=False))
+        
+        # 预先计算每条周期数据对应的日线索引
+        result_to_daily_idx, next_to_daily_idx = cls._map_to_daily_idx(result_df, daily_df, period)
+        
+        # 20均线策略使用的上穿日期索引和连续天数只计算一次，策略内直接查表
+        ma20_cross_up_idx, below_ma20_count = None, None
+        if any(strategy.KIND == STRATEGY_BELOW_MA20 for strategy in strategy_instances):
+            ma20_cross_up_idx, below_ma20_count = precompute_ma20_signals(daily_closes, daily_ma20)
+        
+        # 策略上下文只构建一次，卖出判断时只更新随K线变化的字段（卖出判断只在持仓时进行）
+        strategy_context = SellContext(daily_df=daily_df, daily_closes=daily_closes, daily_ma20=daily_ma20,
+                                       daily_ma20_cross_up_idx=ma20_cross_up_idx,
+                                       daily_below_ma20_count=below_ma20_count,
+                                       result_df=result_df, period=period, position=True)
+        
+        # 可以产生信号的K线（最后一条数据不能买入，因为没有下一条数据）及其中的买入信号位置
+        bar_count = len(result_df) - 1
+        buy_bars = np.flatnonzero(result_buy_signals[:max(bar_count, 0)] == 1)
+        
+        # 遍历数据，模拟交易
+        i = -1
+        while i + 1 < bar_count:
+            i += 1
+            if not position:
+                # 空仓时只有买入信号K线需要处理，二分查找直接跳到下一个买入信号
+                pos = np.searchsorted(buy_bars, i)
+                if pos >= len(buy_bars):
+                    break
+                i = int(buy_bars[pos])
+            
+            current_date = result_dates[i]
+            next_date = result_dates[i + 1]
+            current_buy_signal = result_buy_signals[i]
+            next_open = result_opens[i + 1]
+            current_close = result_closes[i]
+            
+            # 当前日期对应的日线数据索引（预先计算）
+            current_daily_idx = int(result_to_daily_idx[i])
+            
+            # 买入信号：CROSS(趋势线,buy_threshold) - 趋势线从下向上穿越buy_threshold
+            if current_buy_signal == 1 and not position:
+                # 验证下一天的开盘价是否有效
+                if math.isnan(next_open) or next_open <= 0:
+                    # 如果下一天开盘价无效，跳过此次买入信号
+                    logger.warning(f'日期 {current_date} 的买入信号被跳过：下一天开盘价无效 (next_open={next_open})')
+                    continue
+                
+                # 验证现金是否足够（虽然全仓买入，但需要确保有现金）
+                if cash <= 0:
+                    logger.warning(f'日期 {current_date} 的买入信号被跳过：现金不足 (cash={cash})')
+                    continue
+                
+                # 第二天开盘价买入
+                buy_price = float(next_open)
+                buy_amount = cash  # 使用当前现金全仓买入
+                
+                # 计算买入股数，确保不会因为价格问题导致除零或负数
+                if buy_price > 0:
+                    shares = buy_amount / buy_price
+                else:
+                    logger.error(f'日期 {current_date} 的买入信号被跳过：买入价格无效 (buy_price={buy_price})')
+                    continue
+                
+                # 验证买入股数是否有效
+                if shares <= 0 or math.isnan(shares):
+                    logger.error(f'日期 {current_date} 的买入信号被跳过：买入股数无效 (shares={shares})')
+                    continue
+                
+                cash = 0
+                position = True
+                
+                # 买入日期索引（用于后续20日均线检查）
+                buy_date_idx = int(next_to_daily_idx[i])
+                
+                # 如果找不到买入日期索引，记录警告但继续执行
+                if buy_date_idx < 0:
+                    logger.warning(f'无法找到买入日期 {next_date} 对应的日线索引，20均线策略可能无法正常工作')
+                
+                # 检查买入时收盘价是否在20均线下方（只有这种情况才触发上穿策略）
+                buy_below_ma20 = False
+                if buy_date_idx >= 0 and buy_date_idx < len(daily_df):
+                    buy_day_close = daily_closes[buy_date_idx]
+                    buy_day_ma20 = daily_ma20[buy_date_idx]
+                    # 如果买入时收盘价在20均线下方，才启用上穿策略
+                    if not math.isnan(buy_day_close) and not math.isnan(buy_day_ma20):
+                        buy_below_ma20 = buy_day_close < buy_day_ma20
+                
+                # 重置所有策略状态并设置买入信息
+                for strategy in strategy_instances:
+                    try:
+                        strategy.reset()
+                        # 为需要买入信息的策略设置信息
+                        kind = strategy.KIND
+                        if kind == STRATEGY_BELOW_MA20:
+                            strategy.set_buy_info(buy_date_idx, buy_below_ma20)
+                        elif kind == STRATEGY_TRAILING_STOP:
+                            strategy.set_buy_info(buy_price, buy_date_idx)
+                        elif kind == STRATEGY_STOP_LOSS or kind == STRATEGY_TAKE_PROFIT:
+                            strategy.set_buy_info(buy_date_idx)
+                    except Exception as e:
+                        logger.warning(f'设置策略 {strategy.get_name()} 买入信息时发生错误: {str(e)}', exc_info=True)
+                        # 继续执行，不中断回测流程
+                
+                trades.add_buy(i + 1, buy_price, shares, buy_amount)
+            
+            # 卖出逻辑（仅在持仓时执行）
+            elif position:
+                should_sell = False
+                sell_reason = ''
+                
+                # 更新策略上下文
+                strategy_context.current_close = current_close
+                strategy_context.buy_price = buy_price
+                strategy_context.buy_date_idx = buy_date_idx
+                strategy_context.current_daily_idx = current_daily_idx
+                
+                # 根据策略关系（AND/OR）判断是否卖出
+                if relation_is_and:
+                    # AND关系：所有策略都必须触发才卖出
+                    triggered_strategies = []
+                    all_triggered = True
+                    
+                    for strategy in strategy_instances:
+                        try:
+                            sell, reason = strategy.should_sell(strategy_context)
+                            if sell:
+                                triggered_strategies.append(reason)
+                            else:
+                                all_triggered = False
+                        except Exception as e:
+                            logger.warning(f'策略 {strategy.get_name()} 判断卖出时发生错误: {str(e)}', exc_info=True)
+                            # 如果策略出错，在AND模式下视为未触发
+                            all_triggered = False
+                    
+                    if all_triggered and len(triggered_strategies) > 0:
+                        should_sell = True
+                        sell_reason = ' & '.join(triggered_strategies)  # 组合所有触发的原因
+                else:
+                    # OR关系（默认）：任一策略触发即卖出
+                    for strategy in strategy_instances:
+                        try:
+                            sell, reason = strategy.should_sell(strategy_context)
+                            if sell:
+                                should_sell = True
+                                sell_reason = reason
+                                break  # 任一策略触发卖出即执行
+                        except Exception as e:
+                            logger.warning(f'策略 {strategy.get_name()} 判断卖出时发生错误: {str(e)}', exc_info=True)
+                            # 如果策略出错，在OR模式下继续检查其他策略
+                            continue
+                
+                # 执行卖出
+                if should_sell:
+                    # 验证下一天的开盘价是否有效
+                    if math.isnan(next_open) or next_open <= 0:
+                        logger.warning(f'日期 {current_date} 的卖出信号被跳过：下一天开盘价无效 (next_open={next_open})')
+                        continue
+                    
+                    # 验证持仓数量是否有效
+                    if shares <= 0 or math.isnan(shares):
+                        logger.warning(f'日期 {current_date} 的卖出信号被跳过：持仓数量无效 (shares={shares})')
+                        continue
+                    
+                    # 第二天开盘价卖出
+                    sell_price = float(next_open)
+                    cash = shares * sell_price  # 全仓卖出
+                    trades.add_sell(i + 1, sell_price, shares, cash, sell_reason)
+                    shares = 0
+                    position = False
+                    buy_below_ma20 = False
+                    buy_date_idx = -1
+                    
+                    # 重置所有策略状态
+                    for strategy in strategy_instances:
+                        try:
+                            strategy.reset()
+                        except Exception as e:
+                            logger.warning(f'重置策略 {strategy.get_name()} 状态时发生错误: {str(e)}', exc_info=True)
+                            # 继续执行，不中断回测流程
+        
+        return trades, cash, shares, position, buy_price
+
+
+def _calculate_backtest_worker(config: dict) -> dict:
+    """
+    批量回测的子进程入口（模块级函数，便于进程池序列化）
+    """
+    return BacktestService.calculate_backtest(**config)
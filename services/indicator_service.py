@@ -3,16 +3,30 @@
 负责计算股票技术指标和信号
 """
 
+import copy
+import importlib.util
+import os
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
 import logging
+import threading
+import time
+from collections import OrderedDict
 import traceback
-from models.indicator import StockIndicator
+from models.indicator import StockIndicator, INDICATOR_INPUT_COLS, warmup as warmup_indicator_kernels
 from utils.data_loader import load_stock_data
 from utils.period_converter import convert_to_period
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# Parquet缓存文件需要pyarrow（可选，未安装时每次冷启动都读取Excel）
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# 日线数据缓存保留的列：指标计算的输入列和20日均线
+DAILY_DATA_COLS = INDICATOR_INPUT_COLS + ['ma20']
+
 
 def format_decimal(value, decimals=3):
     """
@@ -33,27 +47,403 @@ def format_decimal(value, decimals=3):
         return None
 
 
+def format_decimal_array(values, decimals=3) -> np.ndarray:
+    """
+    按列格式化数值为指定小数位数（结果与对每个元素调用format_decimal一致，NaN保持为NaN）
+    
+    Args:
+        values: 数值数组（可以是多维数组）
+        decimals: 小数位数，默认3位
+        
+    Returns:
+        格式化后的float64数组
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, decimals)
+    
+    # np.round先缩放再取整，缩放后小数部分非常接近0.5时可能与Python的round结果不同，这些值逐个用round计算
+    with np.errstate(invalid='ignore'):
+        scaled = np.abs(values) * 10.0 ** decimals
+        near_half = np.abs(scaled - np.floor(scaled) - 0.5) <= 1e-9 + scaled * 1e-14
+    for k in np.flatnonzero(near_half):
+        rounded.flat[k] = round(float(values.flat[k]), decimals)
+    return rounded
+
+
+def to_json_list(values) -> list:
+    """
+    将float数组转换为可JSON序列化的列表，NaN转换为None
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def format_date_list(values) -> list:
+    """
+    将日期数组格式化为'YYYY-MM-DD'字符串列表，NaT转换为None
+    
+    通过numpy的datetime64[D]转换整体完成，不逐个调用strftime
+    """
+    days = np.asarray(values).astype('datetime64[D]')
+    return np.where(np.isnat(days), None, np.datetime_as_string(days)).tolist()
+
+
 class IndicatorService:
     """指标计算服务类"""
     
-    # 全局缓存，避免重复加载数据（按文件路径缓存）
-    _cached_daily_data = {}
+    # 各缓存均为按最近使用顺序淘汰的有界缓存（LRU）
+    # 全局缓存，避免重复加载数据（按文件路径缓存，值为(文件修改时间, 日线数据)）
+    _cached_daily_data = OrderedDict()
+    _CACHE_MAX = 8
+    # 周期转换结果缓存，键为(文件路径, 周期)，值为(转换所用的日线数据, 周期数据)
+    _cached_period_data = OrderedDict()
+    _PERIOD_CACHE_MAX = 16
+    # 日线20日均线查找表缓存，键为文件路径，值为(构建所用的日线数据, 查找表)
+    _cached_ma20_lookup = OrderedDict()
+    # 信号计算结果缓存，键为(文件路径, 文件修改时间, 周期, 开始日期, 结束日期, 买入阈值)
+    _signal_cache = OrderedDict()
+    _SIGNAL_CACHE_MAX = 128
+    # 回测指标计算结果缓存，键由调用方给出，值为(计算所用的日线数据, 指标结果)
+    _cached_indicator_data = OrderedDict()
+    _INDICATOR_CACHE_MAX = 32
+    _cache_lock = threading.Lock()  # 保护各缓存字典的读写（只在字典操作期间持有）
+    _load_lock = threading.Lock()  # 串行加载数据文件，避免Flask多线程下重复加载同一文件
+    _kernels_warmed = False  # 指标计算的numba内核是否已预编译
+    # 数据文件修改时间缓存，值为(修改时间, 检查时刻)，TTL内不重复读取文件状态
+    _mtime_cache = {}
+    _MTIME_TTL = 1.0
+    
+    @classmethod
+    def _file_mtime(cls, file_path: str) -> float:
+        """
+        获取数据文件修改时间（_MTIME_TTL秒内复用上次结果，高并发时不必每个请求都读取文件状态）
+        
+        Raises:
+            FileNotFoundError: 文件不存在
+        """
+        now = time.monotonic()
+        cached = cls._mtime_cache.get(file_path)
+        if cached is not None and now - cached[1] < cls._MTIME_TTL:
+            return cached[0]
+        mtime = os.path.getmtime(file_path)
+        cls._mtime_cache[file_path] = (mtime, now)
+        return mtime
+    
+    @classmethod
+    def _cache_get(cls, cache: OrderedDict, key):
+        """
+        从LRU缓存中读取，命中时标记为最近使用；未命中返回None
+        """
+        with cls._cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+    
+    @classmethod
+    def _cache_put(cls, cache: OrderedDict, key, value, max_size: int):
+        """
+        写入LRU缓存，超过容量时淘汰最久未使用的条目
+        """
+        with cls._cache_lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > max_size:
+                cache.popitem(last=False)
+    
+    @classmethod
+    def clear_cache(cls):
+        """
+        清空日线数据缓存和信号计算结果缓存（数据文件更新后调用）
+        """
+        with cls._cache_lock:
+            cls._cached_daily_data.clear()
+            cls._cached_period_data.clear()
+            cls._cached_ma20_lookup.clear()
+            cls._signal_cache.clear()
+            cls._cached_indicator_data.clear()
+            cls._mtime_cache.clear()
     
     @classmethod
     def get_daily_data(cls, file_path: str = 'data/159915.xlsx'):
         """
         获取日线数据（带缓存）
         
+        加载时统一完成日期类型转换和排序，之后各请求直接复用，无需重复处理；
+        数据文件修改后自动重新加载。返回的DataFrame为共享缓存，调用方不应修改
+        
         Args:
             file_path: 数据文件路径
 
         Returns:
-            日线数据DataFrame
+            按日期排序的日线数据DataFrame
         """
+        mtime = cls._file_mtime(file_path)
         # 使用文件路径作为缓存键
-        if file_path not in cls._cached_daily_data:
-            cls._cached_daily_data[file_path] = load_stock_data(file_path)
-        return cls._cached_daily_data[file_path]
+        cached = cls._cache_get(cls._cached_daily_data, file_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with cls._load_lock:
+            # 等待加载锁期间其他线程可能已完成加载
+            cached = cls._cache_get(cls._cached_daily_data, file_path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            daily_df = cls._load_daily_data(file_path, mtime)
+            cls._cache_put(cls._cached_daily_data, file_path, (mtime, daily_df), cls._CACHE_MAX)
+            # 首次成功加载数据后预编译指标内核（批量回测时在主进程完成，子进程直接继承）
+            if not cls._kernels_warmed:
+                warmup_indicator_kernels()
+                cls._kernels_warmed = True
+            return daily_df
+    
+    @staticmethod
+    def _load_daily_data(file_path: str, mtime: float) -> pd.DataFrame:
+        """
+        读取数据文件并完成日期转换、排序和列筛选
+        
+        安装pyarrow时，处理结果同时保存为同名的.parquet文件，之后冷启动直接读取该文件
+        （数据文件比.parquet文件新时重新读取数据文件）
+        
+        Args:
+            file_path: 数据文件路径
+            mtime: 数据文件修改时间
+            
+        Returns:
+            按日期排序的日线数据DataFrame
+        """
+        parquet_path = os.path.splitext(file_path)[0] + '.parquet'
+        if PARQUET_AVAILABLE and parquet_path != file_path and os.path.exists(parquet_path) \
+                and os.path.getmtime(parquet_path) >= mtime:
+            try:
+                return pd.read_parquet(parquet_path)
+            except Exception as e:
+                logger.warning(f'读取Parquet缓存文件 {parquet_path} 失败，改为读取数据文件: {str(e)}')
+        
+        daily_df = load_stock_data(file_path)
+        if 'date' in daily_df.columns:
+            # 日期只在加载时解析一次，后续请求直接复用datetime列
+            if not is_datetime64_any_dtype(daily_df['date']):
+                daily_df['date'] = pd.to_datetime(daily_df['date'])
+            daily_df = daily_df.sort_values('date', kind='stable').reset_index(drop=True)
+        # 只保留计算需要的列
+        daily_df = daily_df[[col for col in DAILY_DATA_COLS if col in daily_df.columns]]
+        
+        if PARQUET_AVAILABLE and parquet_path != file_path:
+            try:
+                daily_df.to_parquet(parquet_path, index=False)
+            except Exception as e:
+                # 数据目录不可写等情况不影响正常使用
+                logger.warning(f'保存Parquet缓存文件 {parquet_path} 失败: {str(e)}')
+        return daily_df
+    
+    @classmethod
+    def get_period_data(cls, file_path: str, period: str):
+        """
+        获取完整日线数据转换后的周期数据（带缓存）
+        
+        每个文件的每种周期只转换一次，日线数据重新加载后自动重新转换
+        
+        Args:
+            file_path: 数据文件路径
+            period: 周期类型，'D'=日线, 'W'=周线, 'M'=月线
+
+        Returns:
+            按日期排序的周期数据DataFrame（浅拷贝：调用方可以增删或替换列，但不应原地修改已有列的值）
+        """
+        daily_df = cls.get_daily_data(file_path)
+        period = period.upper()
+        if period == 'D':
+            return daily_df.copy(deep=False)
+        
+        key = (file_path, period)
+        cached = cls._cache_get(cls._cached_period_data, key)
+        if cached is None or cached[0] is not daily_df:
+            cached = (daily_df, convert_to_period(daily_df, period))
+            cls._cache_put(cls._cached_period_data, key, cached, cls._PERIOD_CACHE_MAX)
+        return cached[1].copy(deep=False)
+    
+    @classmethod
+    def get_cached_indicators(cls, key, daily_df: pd.DataFrame):
+        """
+        读取指标计算结果缓存（日线数据重新加载后缓存自动失效）
+        
+        Args:
+            key: 缓存键（需包含决定计算结果的全部参数）
+            daily_df: get_daily_data返回的日线数据
+            
+        Returns:
+            指标结果DataFrame（浅拷贝，调用方不应原地修改已有列的值）；未命中返回None
+        """
+        cached = cls._cache_get(cls._cached_indicator_data, key)
+        if cached is None or cached[0] is not daily_df:
+            return None
+        return cached[1].copy(deep=False)
+    
+    @classmethod
+    def cache_indicators(cls, key, daily_df: pd.DataFrame, result_df: pd.DataFrame):
+        """
+        写入指标计算结果缓存
+        
+        Args:
+            key: 缓存键
+            daily_df: 计算所用的get_daily_data返回的日线数据
+            result_df: 指标结果DataFrame（写入后不应再修改）
+        """
+        cls._cache_put(cls._cached_indicator_data, key, (daily_df, result_df), cls._INDICATOR_CACHE_MAX)
+    
+    @staticmethod
+    def filter_by_date_range(df: pd.DataFrame, start_date: str = None, end_date: str = None) -> pd.DataFrame:
+        """
+        按时间范围截取数据（要求df已按date列升序排列）
+        
+        通过二分查找定位起止位置后切片，避免对整列做布尔比较
+        
+        Args:
+            df: 按日期排序的DataFrame
+            start_date: 开始日期（包含），可选
+            end_date: 结束日期（包含），可选
+            
+        Returns:
+            时间范围内的数据
+        """
+        if not start_date and not end_date:
+            return df
+        
+        dates = df['date']
+        start_pos = dates.searchsorted(pd.to_datetime(start_date), side='left') if start_date else 0
+        if end_date:
+            end_pos = dates.searchsorted(pd.to_datetime(end_date), side='right')
+        elif len(dates) > 0 and pd.isna(dates.iat[-1]):
+            # 排序后NaT位于末尾，与按条件过滤一样将其排除
+            end_pos = int(dates.notna().sum())
+        else:
+            end_pos = len(dates)
+        return df.iloc[start_pos:end_pos]
+    
+    @staticmethod
+    def _to_json_column(series: pd.Series) -> list:
+        """
+        将一列数据转换为可JSON序列化的列表：数值保留3位小数，其他值转为字符串，缺失值为None
+        """
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            return to_json_list(format_decimal_array(series.to_numpy(dtype=np.float64, na_value=np.nan)))
+        return [
+            None if pd.isna(value) else (format_decimal(value) if isinstance(value, (int, float)) else str(value))
+            for value in series.tolist()
+        ]
+    
+    @staticmethod
+    def _to_records(columns: dict) -> list:
+        """
+        将按列组织的数据（列名 -> 等长列表）组装为记录列表
+        """
+        keys = list(columns)
+        return [dict(zip(keys, values)) for values in zip(*columns.values())]
+    
+    @classmethod
+    def get_daily_ma20_lookup(cls, file_path: str):
+        """
+        获取完整日线数据的20日均线查找表（带缓存，日线数据重新加载后自动重建）
+        
+        Args:
+            file_path: 数据文件路径
+
+        Returns:
+            (日期数组, 20日均线数组)，见_build_daily_ma20_lookup
+        """
+        daily_df = cls.get_daily_data(file_path)
+        cached = cls._cache_get(cls._cached_ma20_lookup, file_path)
+        if cached is None or cached[0] is not daily_df:
+            cached = (daily_df, cls._build_daily_ma20_lookup(daily_df))
+            cls._cache_put(cls._cached_ma20_lookup, file_path, cached, cls._CACHE_MAX)
+        return cached[1]
+    
+    @staticmethod
+    def _build_daily_ma20_lookup(daily_df: pd.DataFrame):
+        """
+        提取有效的日线20日均线及其日期（按日期升序），用于按日期批量查找
+        
+        Returns:
+            (日期数组, 20日均线数组)
+        """
+        dates = daily_df['date'].to_numpy()
+        ma20 = daily_df['ma20'].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(ma20) & ~np.isnat(dates)
+        return dates[valid], ma20[valid]
+    
+    @staticmethod
+    def _lookup_daily_ma20(daily_ma20_lookup, dates: pd.Series) -> np.ndarray:
+        """
+        查找各日期对应的日线20日均线（直接使用表格中的MA.MA3值）
+        
+        取该日期或之前最接近的有效日期（最多向前10天），找不到则为NaN；
+        通过二分查找一次完成所有日期的匹配
+        
+        Args:
+            daily_ma20_lookup: _build_daily_ma20_lookup返回的(日期数组, 20日均线数组)
+            dates: 要查找的日期
+            
+        Returns:
+            与dates等长的20日均线数组
+        """
+        ma20_dates, ma20_values = daily_ma20_lookup
+        targets = dates.to_numpy().astype(ma20_dates.dtype)
+        ma20_result = np.full(len(targets), np.nan)
+        if len(ma20_dates) == 0:
+            return ma20_result
+        
+        pos = np.searchsorted(ma20_dates, targets, side='right') - 1
+        found = (pos >= 0) & ~np.isnat(targets)
+        found[found] = targets[found] - ma20_dates[pos[found]] <= np.timedelta64(10, 'D')
+        ma20_result[found] = ma20_values[pos[found]]
+        return ma20_result
+    
+    @classmethod
+    def _build_signal_list(cls, result_df: pd.DataFrame, signal_mask: np.ndarray, reason_col: str,
+                           default_reason: str, daily_ma20_lookup) -> list:
+        """
+        将买入或卖出信号行组装为按日期倒序排列的信号列表
+        
+        Args:
+            result_df: 指标计算结果
+            signal_mask: 信号所在行的布尔数组
+            reason_col: 信号原因列名
+            default_reason: 原因列缺失或为空值时使用的默认原因
+            daily_ma20_lookup: _build_daily_ma20_lookup返回的日线20日均线查找表
+            
+        Returns:
+            信号字典列表
+        """
+        # 没有信号时直接返回，不做切片、排序和格式化
+        if not signal_mask.any():
+            return []
+        
+        display_cols = ['date', 'close', '趋势线', reason_col]
+        # 行过滤和列选择一次完成（date列已由调用方统一转换为datetime类型）
+        display = result_df.loc[signal_mask, [col for col in display_cols if col in result_df.columns]]
+        # 按日期倒序排序
+        display = display.sort_values('date', ascending=False)
+        
+        if reason_col in display.columns:
+            reasons = display[reason_col]
+            reasons = reasons.astype(object).where(reasons.notna(), default_reason).astype(str).tolist()
+        else:
+            reasons = [default_reason] * len(display)
+        
+        # 收盘价、趋势线和20日均线拼成一个float64矩阵，一次完成取3位小数和列表转换
+        numeric_values = np.column_stack([
+            display[['close', '趋势线']].to_numpy(dtype=np.float64, na_value=np.nan),
+            cls._lookup_daily_ma20(daily_ma20_lookup, display['date'])
+        ])
+        closes, trend_lines, ma20_values = to_json_list(format_decimal_array(numeric_values).T)
+        
+        return cls._to_records({
+            'date': format_date_list(display['date'].to_numpy()),
+            'close': closes,
+            'trend_line': trend_lines,
+            'ma20': ma20_values,
+            'reason': reasons
+        })
     
     @classmethod
     def calculate_signals(cls, period: str, file_path: str = 'data/159915.xlsx', 
@@ -72,28 +462,21 @@ class IndicatorService:
             包含信号信息的字典
         """
         try:
+            # 相同参数且数据文件未修改时直接返回缓存结果（返回副本，避免调用方修改缓存）
+            cache_key = (file_path, cls._file_mtime(file_path), period.upper(), start_date, end_date, buy_threshold)
+            cached_result = cls._cache_get(cls._signal_cache, cache_key)
+            if cached_result is not None:
+                return copy.deepcopy(cached_result)
+            
             # 周期名称映射
             period_names = {'D': '日线', 'W': '周线', 'M': '月线'}
             period_name = period_names.get(period.upper(), period)
             
-            # 获取日线数据
+            # 获取日线数据（已按日期排序）
             daily_df = cls.get_daily_data(file_path)
             
-            # 计算20日均线（使用日线数据）
-            if 'date' in daily_df.columns:
-                daily_df['date'] = pd.to_datetime(daily_df['date'])
-                daily_df = daily_df.sort_values('date').reset_index(drop=True)
-            
             # 按时间范围过滤日线数据（使用表格中的MA.MA3作为20日均线）
-            if start_date:
-                start_dt = pd.to_datetime(start_date)
-                daily_df_filtered = daily_df[daily_df['date'] >= start_dt].copy()
-            else:
-                daily_df_filtered = daily_df.copy()
-            
-            if end_date:
-                end_dt = pd.to_datetime(end_date)
-                daily_df_filtered = daily_df_filtered[daily_df_filtered['date'] <= end_dt]
+            daily_df_filtered = cls.filter_by_date_range(daily_df, start_date, end_date)
             
             # 使用表格中的MA.MA3作为20日均线（完全使用表格中的值，不计算）
             if 'ma20' not in daily_df_filtered.columns:
@@ -106,31 +489,16 @@ class IndicatorService:
             # 完全使用表格中的MA.MA3值，不进行任何计算或填充
             # 对于NaN值，保持NaN，在后续使用时会跳过这些行
             
-            # 创建日期到20日均线的映射（用于快速查找）
+            # 20日均线查找表（按日期二分查找，每个文件只构建一次）
             # 使用完整的日线数据，而不是过滤后的数据，以便查找所有日期的20日均线
-            daily_ma20_map = {}
-            for idx, row in daily_df.iterrows():
-                if pd.notna(row['ma20']):
-                    daily_ma20_map[row['date']] = row['ma20']
+            daily_ma20_lookup = cls.get_daily_ma20_lookup(file_path)
             
             # 如果选择周线或月线，进行周期转换
-            if period.upper() != 'D':
-                df = convert_to_period(daily_df, period.upper())
-            else:
-                df = daily_df.copy()
+            df = cls.get_period_data(file_path, period)
             
-            # 确保date列是datetime类型
+            # 按时间范围过滤数据（周期转换结果同样按日期排序）
             if 'date' in df.columns:
-                df['date'] = pd.to_datetime(df['date'])
-                
-                # 按时间范围过滤数据
-                if start_date:
-                    start_dt = pd.to_datetime(start_date)
-                    df = df[df['date'] >= start_dt]
-                
-                if end_date:
-                    end_dt = pd.to_datetime(end_date)
-                    df = df[df['date'] <= end_dt]
+                df = cls.filter_by_date_range(df, start_date, end_date)
             
             # 如果过滤后没有数据，返回错误
             if len(df) == 0:
@@ -161,7 +529,7 @@ class IndicatorService:
             # 数据验证：确保价格数据有效
             price_columns = ['open', 'high', 'low', 'close']
             for col in price_columns:
-                if df[col].isna().all():
+                if np.isnan(df[col].to_numpy(dtype=np.float64, copy=False)).all():
                     return {
                         'success': False,
                         'error': f'列 {col} 的数据全部为NaN，无法计算指标',
@@ -169,11 +537,12 @@ class IndicatorService:
                     }
             
             # 创建指标计算器
-            indicator = StockIndicator(n=5)
+            indicator = StockIndicator(n=5, engine='numba')
             
-            # 计算所有指标
+            # 计算所有指标（只传入指标计算需要的列，避免排序时复制表格中的其他列）
             try:
-                result_df = indicator.calculate_all(df.copy(), buy_threshold=buy_threshold)
+                result_df = indicator.calculate_all(df[[col for col in INDICATOR_INPUT_COLS if col in df.columns]],
+                                                    buy_threshold=buy_threshold)
             except ValueError as e:
                 # 处理指标计算中的值错误
                 logger.error(f'指标计算时发生值错误: {str(e)}', exc_info=True)
@@ -183,135 +552,55 @@ class IndicatorService:
                     'error_code': 'INDICATOR_CALCULATION_ERROR'
                 }
             
+            # date列统一在这里确保为datetime类型，后续信号和最近数据直接使用
+            if not is_datetime64_any_dtype(result_df['date']):
+                result_df['date'] = pd.to_datetime(result_df['date'])
+            
+            # 信号位置（numpy布尔数组，只计算一次，统计和取信号行共用；各信号列取值为0或1）
+            buy_mask = result_df['买'].to_numpy() == 1
+            sell_mask = result_df['卖'].to_numpy() == 1
+            oversold_mask = result_df['超卖区'].to_numpy() == 1
+            overbought_mask = result_df['超买区'].to_numpy() == 1
+            
             # 统计信号
-            buy_signals_count = int(result_df['买'].sum())
-            sell_signals_count = int(result_df['卖'].sum())
-            oversold_count = int(result_df['超卖区'].sum())
-            overbought_count = int(result_df['超买区'].sum())
+            buy_signals_count = int(np.count_nonzero(buy_mask))
+            sell_signals_count = int(np.count_nonzero(sell_mask))
+            oversold_count = int(np.count_nonzero(oversold_mask))
+            overbought_count = int(np.count_nonzero(overbought_mask))
             
-            # 获取买入信号位置
-            buy_positions = result_df[result_df['买'] == 1]
-            buy_signals_list = []
-            if len(buy_positions) > 0:
-                # 包含买入原因列
-                buy_cols = ['date', 'close', '趋势线', '买入原因']
-                available_buy_cols = [col for col in buy_cols if col in buy_positions.columns]
-                buy_display = buy_positions[available_buy_cols].copy()
-                if 'date' in buy_display.columns:
-                    buy_display['date'] = pd.to_datetime(buy_display['date'])
-                    # 按日期倒序排序
-                    buy_display = buy_display.sort_values('date', ascending=False)
-                    buy_display['date'] = buy_display['date'].dt.strftime('%Y-%m-%d')
-                for _, row in buy_display.iterrows():
-                    signal_date = pd.to_datetime(row['date'])
-                    # 获取该日期对应的日线20日均线（直接使用表格中的MA.MA3值）
-                    ma20_value = None
-                    # 首先尝试直接查找该日期
-                    if signal_date in daily_ma20_map:
-                        ma20_value = daily_ma20_map[signal_date]
-                    else:
-                        # 如果找不到，查找最接近的日期（向前查找，最多10天）
-                        for days_back in range(1, 11):
-                            check_date = signal_date - pd.Timedelta(days=days_back)
-                            if check_date in daily_ma20_map:
-                                ma20_value = daily_ma20_map[check_date]
-                                break
-                    
-                    signal_item = {
-                        'date': str(row['date']),
-                        'close': format_decimal(row['close']),
-                        'trend_line': format_decimal(row['趋势线']),
-                        'ma20': format_decimal(ma20_value)
-                    }
-                    # 添加买入原因（如果有）
-                    if '买入原因' in row:
-                        signal_item['reason'] = str(row['买入原因']) if pd.notna(row['买入原因']) else '趋势线从下向上穿越10'
-                    else:
-                        signal_item['reason'] = '趋势线从下向上穿越10'
-                    buy_signals_list.append(signal_item)
+            # 获取买入信号
+            buy_signals_list = cls._build_signal_list(result_df, buy_mask, '买入原因', '趋势线从下向上穿越10',
+                                                      daily_ma20_lookup)
             
-            # 获取卖出信号位置
-            sell_positions = result_df[result_df['卖'] == 1]
-            sell_signals_list = []
-            if len(sell_positions) > 0:
-                # 包含卖出原因列
-                sell_cols = ['date', 'close', '趋势线', '卖出原因']
-                available_sell_cols = [col for col in sell_cols if col in sell_positions.columns]
-                sell_display = sell_positions[available_sell_cols].copy()
-                if 'date' in sell_display.columns:
-                    sell_display['date'] = pd.to_datetime(sell_display['date'])
-                    # 按日期倒序排序
-                    sell_display = sell_display.sort_values('date', ascending=False)
-                    sell_display['date'] = sell_display['date'].dt.strftime('%Y-%m-%d')
-                for _, row in sell_display.iterrows():
-                    signal_date = pd.to_datetime(row['date'])
-                    # 获取该日期对应的日线20日均线（直接使用表格中的MA.MA3值）
-                    ma20_value = None
-                    # 首先尝试直接查找该日期
-                    if signal_date in daily_ma20_map:
-                        ma20_value = daily_ma20_map[signal_date]
-                    else:
-                        # 如果找不到，查找最接近的日期（向前查找，最多10天）
-                        for days_back in range(1, 11):
-                            check_date = signal_date - pd.Timedelta(days=days_back)
-                            if check_date in daily_ma20_map:
-                                ma20_value = daily_ma20_map[check_date]
-                                break
-                    
-                    signal_item = {
-                        'date': str(row['date']),
-                        'close': format_decimal(row['close']),
-                        'trend_line': format_decimal(row['趋势线']),
-                        'ma20': format_decimal(ma20_value)
-                    }
-                    # 添加卖出原因（如果有）
-                    if '卖出原因' in row:
-                        signal_item['reason'] = str(row['卖出原因']) if pd.notna(row['卖出原因']) else '-'
-                    else:
-                        signal_item['reason'] = '-'
-                    sell_signals_list.append(signal_item)
+            # 获取卖出信号
+            sell_signals_list = cls._build_signal_list(result_df, sell_mask, '卖出原因', '-', daily_ma20_lookup)
             
             # 获取最近20条关键指标数据（按日期倒序）
             key_cols = ['date', 'close', '支撑', '阻力', '中线', '趋势线', '买', '卖']
             available_cols = [col for col in key_cols if col in result_df.columns]
-            recent_data = result_df[available_cols].tail(20).copy()
-            if 'date' in recent_data.columns:
-                recent_data['date'] = pd.to_datetime(recent_data['date'])
-                # 按日期倒序排序
-                recent_data = recent_data.sort_values('date', ascending=False)
-                recent_data['date'] = recent_data['date'].dt.strftime('%Y-%m-%d')
+            # 按日期倒序排序
+            recent_data = result_df[available_cols].tail(20).sort_values('date', ascending=False)
             
-            recent_data_list = []
-            for _, row in recent_data.iterrows():
-                data_item = {}
-                for col in available_cols:
-                    value = row[col]
-                    if pd.notna(value):
-                        if isinstance(value, (int, float)):
-                            data_item[col] = format_decimal(value)
-                        else:
-                            data_item[col] = str(value)
-                    else:
-                        data_item[col] = None
-                
-                # 添加20日均线（使用表格中的MA.MA3值）
-                signal_date = pd.to_datetime(row['date'])
-                ma20_value = None
-                # 首先尝试直接查找该日期
-                if signal_date in daily_ma20_map:
-                    ma20_value = daily_ma20_map[signal_date]
+            # 按列类型一次性格式化后再组装为记录，避免逐行逐单元格判断类型：
+            # 数值列合并为一个float64矩阵整体取3位小数，其他列逐列转换
+            numeric_cols = [col for col in available_cols
+                            if col != 'date' and pd.api.types.is_numeric_dtype(recent_data[col].dtype)]
+            numeric_values = recent_data[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+            numeric_columns = dict(zip(numeric_cols, to_json_list(format_decimal_array(numeric_values).T)))
+            recent_columns = {}
+            for col in available_cols:
+                if col == 'date':
+                    recent_columns[col] = format_date_list(recent_data[col].to_numpy())
+                elif col in numeric_columns:
+                    recent_columns[col] = numeric_columns[col]
                 else:
-                    # 如果找不到，查找最接近的日期（向前查找，最多10天）
-                    for days_back in range(1, 11):
-                        check_date = signal_date - pd.Timedelta(days=days_back)
-                        if check_date in daily_ma20_map:
-                            ma20_value = daily_ma20_map[check_date]
-                            break
-                
-                data_item['ma20'] = format_decimal(ma20_value)
-                recent_data_list.append(data_item)
+                    recent_columns[col] = cls._to_json_column(recent_data[col])
+            # 添加20日均线（使用表格中的MA.MA3值）
+            recent_columns['ma20'] = to_json_list(format_decimal_array(
+                cls._lookup_daily_ma20(daily_ma20_lookup, recent_data['date'])))
+            recent_data_list = cls._to_records(recent_columns)
             
-            return {
+            result = {
                 'success': True,
                 'period': period.upper(),
                 'period_name': period_name,
@@ -326,6 +615,8 @@ class IndicatorService:
                 'sell_signals': sell_signals_list,
                 'recent_data': recent_data_list
             }
+            cls._cache_put(cls._signal_cache, cache_key, copy.deepcopy(result), cls._SIGNAL_CACHE_MAX)
+            return result
             
         except FileNotFoundError as e:
             logger.error(f'数据文件未找到: {file_path}', exc_info=True)
@@ -3,33 +3,223 @@
 使用策略模式实现不同的卖出策略
 """
 
-import pandas as pd
 import numpy as np
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Any, Tuple
+from utils.jit import njit, NUMBA_AVAILABLE
+
+
+# 卖出策略类型编号（回测循环按编号分派，避免逐K线比较策略名称字符串）
+STRATEGY_CUSTOM = -1
+STRATEGY_STOP_LOSS = 0
+STRATEGY_TAKE_PROFIT = 1
+STRATEGY_BELOW_MA20 = 2
+STRATEGY_TRAILING_STOP = 3
+BUILTIN_STRATEGY_COUNT = 4
+
+# should_sell未触发卖出时的返回值（元组不可变，所有策略共用同一个）
+_NO_SELL: Tuple[bool, str] = (False, '')
+
+
+@njit(cache=True)
+def scan_profit_threshold(daily_closes, buy_price, buy_date_idx, current_daily_idx, last_check_idx,
+                          percent, is_take_profit):
+    """
+    止损/止盈扫描（逻辑与 StopLossStrategy / TakeProfitStrategy 一致）
+
+    Returns:
+        (是否触发, 触发日收盘价, 新的last_check_idx)
+    """
+    if buy_price <= 0 or buy_date_idx < 0 or current_daily_idx < 0:
+        return False, 0.0, last_check_idx
+
+    check_start_idx = max(buy_date_idx + 1, last_check_idx + 1)
+    if check_start_idx > current_daily_idx:
+        return False, 0.0, last_check_idx
+
+    # 检查终点一次性截断到数组末尾，循环内不再逐日判断越界
+    check_end_idx = min(current_daily_idx, len(daily_closes) - 1)
+    for check_idx in range(check_start_idx, check_end_idx + 1):
+        daily_close = daily_closes[check_idx]
+        if not np.isnan(daily_close) and daily_close > 0:
+            profit_percent = (daily_close - buy_price) / buy_price * 100
+            if is_take_profit:
+                if profit_percent >= percent:
+                    return True, daily_close, check_idx
+            elif profit_percent <= -percent:
+                return True, daily_close, check_idx
+
+    return False, 0.0, current_daily_idx
+
+
+@njit(cache=True)
+def scan_trailing_stop(daily_closes, buy_price, buy_date_idx, current_daily_idx, last_check_idx,
+                       highest_price, stop_loss_price, trailing_stop_percent):
+    """
+    追踪止损扫描（逻辑与 TrailingStopLossStrategy 一致）
+
+    Returns:
+        (是否触发, 触发日收盘价, 新的last_check_idx, 最高价, 止损价)
+    """
+    if buy_price <= 0 or buy_date_idx < 0 or current_daily_idx < 0:
+        return False, 0.0, last_check_idx, highest_price, stop_loss_price
+
+    check_start_idx = max(buy_date_idx + 1, last_check_idx + 1)
+    if check_start_idx > current_daily_idx:
+        return False, 0.0, last_check_idx, highest_price, stop_loss_price
+
+    check_end_idx = min(current_daily_idx, len(daily_closes) - 1)
+    for check_idx in range(check_start_idx, check_end_idx + 1):
+        daily_close = daily_closes[check_idx]
+        if not np.isnan(daily_close) and daily_close > 0:
+            if daily_close > highest_price:
+                highest_price = daily_close
+                stop_loss_price = highest_price * (1 - trailing_stop_percent / 100)
+            if daily_close < stop_loss_price:
+                return True, daily_close, check_idx, highest_price, stop_loss_price
+
+    return False, 0.0, current_daily_idx, highest_price, stop_loss_price
+
+
+@njit(cache=True)
+def scan_below_ma20(daily_closes, daily_ma20, buy_price, buy_date_idx, current_daily_idx, buy_below_ma20,
+                    crossed_ma20, crossed_ma20_date_idx, close_below_ma20_days, last_ma20_check_idx,
+                    profit_threshold_reached, below_ma20_days, min_profit_percent):
+    """
+    20均线下方策略扫描（逻辑与 BelowMa20Strategy 一致），min_profit_percent为NaN表示不设收益阈值
+
+    Returns:
+        (是否触发, 触发日收盘价, 是否已上穿, 上穿日期索引, 连续下方天数, 上次检查索引, 是否达到收益阈值)
+    """
+    if not buy_below_ma20 or buy_date_idx < 0 or current_daily_idx < 0:
+        return (False, 0.0, crossed_ma20, crossed_ma20_date_idx, close_below_ma20_days,
+                last_ma20_check_idx, profit_threshold_reached)
+
+    # 检查终点一次性截断到数组末尾（buy_date_idx>=0，检查起点至少为1），循环内不再逐日判断越界
+    check_end_idx = min(current_daily_idx, len(daily_closes) - 1, len(daily_ma20) - 1)
+
+    # 第一步：检查买入后是否上穿20均线
+    if not crossed_ma20:
+        for check_idx in range(buy_date_idx + 1, check_end_idx + 1):
+            prev_close = daily_closes[check_idx - 1]
+            prev_ma20 = daily_ma20[check_idx - 1]
+            curr_close = daily_closes[check_idx]
+            curr_ma20 = daily_ma20[check_idx]
+            if (not np.isnan(prev_ma20) and not np.isnan(prev_close) and
+                    not np.isnan(curr_ma20) and not np.isnan(curr_close) and
+                    prev_close <= prev_ma20 and curr_close > curr_ma20):
+                crossed_ma20 = True
+                crossed_ma20_date_idx = check_idx
+                close_below_ma20_days = 0
+                last_ma20_check_idx = check_idx
+                break
+
+    # 第二步：已上穿后统计收盘价在20均线下方的连续天数
+    if crossed_ma20 and crossed_ma20_date_idx >= 0:
+        check_start_idx = max(crossed_ma20_date_idx + 1, last_ma20_check_idx + 1)
+        if check_start_idx > current_daily_idx:
+            return (False, 0.0, crossed_ma20, crossed_ma20_date_idx, close_below_ma20_days,
+                    last_ma20_check_idx, profit_threshold_reached)
+
+        # 设置了收益阈值且尚未达到时，先找到收益首次达到阈值的日期（此前的日期不参与计数），
+        # 之后的计数循环与不设收益阈值时相同，循环内不再计算收益
+        if not np.isnan(min_profit_percent) and buy_price > 0:
+            while check_start_idx <= check_end_idx and not profit_threshold_reached:
+                daily_close = daily_closes[check_start_idx]
+                if (not np.isnan(daily_ma20[check_start_idx]) and not np.isnan(daily_close) and
+                        (daily_close - buy_price) / buy_price * 100 >= min_profit_percent):
+                    profit_threshold_reached = True
+                else:
+                    check_start_idx += 1
+
+        for check_idx in range(check_start_idx, check_end_idx + 1):
+            daily_close = daily_closes[check_idx]
+            daily_ma20_val = daily_ma20[check_idx]
+            if np.isnan(daily_ma20_val) or np.isnan(daily_close):
+                continue
+            if daily_close < daily_ma20_val:
+                close_below_ma20_days += 1
+                if close_below_ma20_days >= below_ma20_days:
+                    return (True, daily_close, crossed_ma20, crossed_ma20_date_idx, close_below_ma20_days,
+                            check_idx, profit_threshold_reached)
+            else:
+                close_below_ma20_days = 0
+
+        last_ma20_check_idx = current_daily_idx
+
+    return (False, 0.0, crossed_ma20, crossed_ma20_date_idx, close_below_ma20_days,
+            last_ma20_check_idx, profit_threshold_reached)
+
+
+class SellContext:
+    """
+    卖出判断上下文
+    
+    回测开始时构建一次，日线数组等不变的字段在整个回测中共享，
+    逐K线只更新current_close/buy_price/buy_date_idx/current_daily_idx。
+    使用__slots__，策略读取字段时为属性访问而不是字典查找。
+    
+    字段：
+        - position: 是否持仓
+        - current_close: 当前收盘价
+        - buy_price: 买入价格
+        - buy_date_idx: 买入日期在日线数据中的索引
+        - current_daily_idx: 当前日期在日线数据中的索引
+        - daily_df: 日线数据DataFrame
+        - daily_closes: 日线收盘价数组（C连续的float64 ndarray，各策略直接切片/传入JIT内核）
+        - daily_ma20: 日线20均线数组（C连续的float64 ndarray）
+        - daily_ma20_cross_up_idx: 日线上穿20均线的日期索引数组（可选，升序，见precompute_ma20_signals）
+        - daily_below_ma20_count: 日线收盘价连续在20均线下方天数数组（可选，见precompute_ma20_signals）
+        - result_df: 周期数据DataFrame
+        - period: 周期类型
+    """
+    
+    __slots__ = ('position', 'current_close', 'buy_price', 'buy_date_idx', 'current_daily_idx',
+                 'daily_df', 'daily_closes', 'daily_ma20', 'daily_ma20_cross_up_idx', 'daily_below_ma20_count',
+                 'result_df', 'period')
+    
+    def __init__(self, daily_df=None, daily_closes: Optional[np.ndarray] = None,
+                 daily_ma20: Optional[np.ndarray] = None, daily_ma20_cross_up_idx: Optional[np.ndarray] = None,
+                 daily_below_ma20_count: Optional[np.ndarray] = None, result_df=None, period: str = '',
+                 position: bool = False, current_close: float = 0.0, buy_price: float = 0.0,
+                 buy_date_idx: int = -1, current_daily_idx: int = -1):
+        self.position = position
+        self.current_close = current_close
+        self.buy_price = buy_price
+        self.buy_date_idx = buy_date_idx
+        self.current_daily_idx = current_daily_idx
+        self.daily_df = daily_df
+        self.daily_closes = daily_closes
+        self.daily_ma20 = daily_ma20
+        self.daily_ma20_cross_up_idx = daily_ma20_cross_up_idx
+        self.daily_below_ma20_count = daily_below_ma20_count
+        self.result_df = result_df
+        self.period = period
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """按字典方式读取字段（兼容以context.get(...)读取上下文的自定义策略）"""
+        return getattr(self, key, default)
 
 
 class SellStrategy(ABC):
     """卖出策略基类"""
     
+    # 策略类型编号，内置策略覆盖为对应编号，自定义策略保持STRATEGY_CUSTOM
+    KIND: int = STRATEGY_CUSTOM
+    
+    # 基类不定义实例字段，内置策略声明__slots__后实例没有__dict__，属性读写为固定偏移访问
+    __slots__ = ()
+    
+    # 上次判断未触发卖出时的(买入日期索引, 当前日线索引)，内置策略据此跳过同一位置的重复判断
+    _last_query_key: Optional[Tuple[int, int]] = None
+    
     @abstractmethod
-    def should_sell(self, context: Dict[str, Any]) -> Tuple[bool, str]:
+    def should_sell(self, context: SellContext) -> Tuple[bool, str]:
         """
         判断是否应该卖出
         
         Args:
-            context: 包含当前状态的上下文字典，包括：
-                - position: 是否持仓
-                - current_close: 当前收盘价
-                - buy_price: 买入价格
-                - buy_date_idx: 买入日期在日线数据中的索引
-                - current_daily_idx: 当前日期在日线数据中的索引
-                - daily_df: 日线数据DataFrame
-                - daily_closes: 日线收盘价数组
-                - daily_ma20: 日线20均线数组
-                - result_df: 周期数据DataFrame
-                - period: 周期类型
-                - 其他策略特定参数
+            context: 卖出判断上下文（见SellContext），包括持仓状态、买入信息、当前日线索引及日线数组等
         
         Returns:
             (是否卖出, 卖出原因)
@@ -51,6 +241,9 @@ class StopLossStrategy(SellStrategy):
     """止损策略：当亏损达到指定比例时卖出
     注意：使用日线数据进行检查，确保不会错过止损点"""
     
+    KIND = STRATEGY_STOP_LOSS
+    __slots__ = ('stop_loss_percent', 'buy_date_idx', 'last_check_idx', '_last_query_key')
+    
     def __init__(self, stop_loss_percent: float):
         """
         初始化止损策略
@@ -64,24 +257,29 @@ class StopLossStrategy(SellStrategy):
         self.stop_loss_percent = stop_loss_percent
         self.buy_date_idx = -1  # 买入日期索引
         self.last_check_idx = -1  # 上次检查的日线索引
+        self._last_query_key = None  # 上次未触发卖出时的查询位置
     
-    def should_sell(self, context: Dict[str, Any]) -> Tuple[bool, str]:
-        if not context.get('position', False):
-            return False, ''
+    def should_sell(self, context: SellContext) -> Tuple[bool, str]:
+        if not context.position:
+            return _NO_SELL
         
-        buy_price = context.get('buy_price', 0)
-        # 优先使用 context 中的 buy_date_idx，如果没有则使用实例变量
-        buy_date_idx = context.get('buy_date_idx', self.buy_date_idx)
-        current_daily_idx = context.get('current_daily_idx', -1)
+        buy_price = context.buy_price
+        buy_date_idx = context.buy_date_idx
+        current_daily_idx = context.current_daily_idx
         
         if buy_price <= 0 or buy_date_idx < 0 or current_daily_idx < 0:
-            return False, ''
+            return _NO_SELL
         
-        daily_df = context.get('daily_df')
-        daily_closes = context.get('daily_closes')
+        daily_df = context.daily_df
+        daily_closes = context.daily_closes
         
         if daily_df is None or daily_closes is None:
-            return False, ''
+            return _NO_SELL
+
+        # 同一持仓在同一日线位置已判断过且未触发时，状态已覆盖到该位置，直接返回
+        query_key = (buy_date_idx, current_daily_idx)
+        if query_key == self._last_query_key:
+            return _NO_SELL
         
         # 使用日线数据进行检查，从买入日期的下一天开始，到当前日期
         # 这样可以确保不会错过任何止损点
@@ -91,33 +289,39 @@ class StopLossStrategy(SellStrategy):
         
         # 确保检查范围有效
         if check_start_idx > check_end_idx:
-            return False, ''
-        
-        # 预先获取数组长度，避免重复计算
-        daily_df_len = len(daily_df)
-        daily_closes_len = len(daily_closes)
-        
-        # 遍历从上次检查位置到当前日期的所有日线数据
-        for check_idx in range(check_start_idx, check_end_idx + 1):
-            if check_idx >= daily_df_len:
-                break
-            
-            daily_close = daily_closes[check_idx] if check_idx < daily_closes_len else None
-            
-            if pd.notna(daily_close) and daily_close > 0:
-                # 计算该日的盈亏比例
-                profit_percent = ((daily_close - buy_price) / buy_price * 100)
-                
-                # 如果亏损达到止损比例，立即卖出
-                if profit_percent <= -self.stop_loss_percent:
-                    self.last_check_idx = check_idx
-                    return True, f'止损({profit_percent:.2f}%)'
+            return _NO_SELL
+        
+        # 安装了numba时使用与回测主循环相同的JIT扫描内核（短区间下比多次NumPy调用更快）
+        if NUMBA_AVAILABLE:
+            triggered, hit_close, self.last_check_idx = scan_profit_threshold(
+                daily_closes, float(buy_price), buy_date_idx, current_daily_idx, self.last_check_idx,
+                float(self.stop_loss_percent), False)
+            if triggered:
+                return True, self.sell_reason(hit_close, buy_price)
+            self._last_query_key = query_key
+            return _NO_SELL
+        
+        # 一次性比较从上次检查位置到当前日期的所有日线数据（切片自动截断到数组末尾）
+        closes = daily_closes[check_start_idx:check_end_idx + 1]
+        profit_percents = (closes - buy_price) / buy_price * 100
+        # NaN与任何值比较均为False，无需单独过滤
+        triggered = (closes > 0) & (profit_percents <= -self.stop_loss_percent)
+        if triggered.any():
+            # 第一个亏损达到止损比例的日期，立即卖出
+            hit = int(np.argmax(triggered))
+            self.last_check_idx = check_start_idx + hit
+            return True, self.sell_reason(closes[hit], buy_price)
         
         # 更新最后检查的索引（即使没有触发止损，也要更新以避免重复检查）
         if check_end_idx >= 0:
             self.last_check_idx = check_end_idx
         
-        return False, ''
+        self._last_query_key = query_key
+        return _NO_SELL
+    
+    def sell_reason(self, daily_close: float, buy_price: float) -> str:
+        """生成卖出原因（只在触发时调用），附带触发日收益"""
+        return f'止损({(daily_close - buy_price) / buy_price * 100:.2f}%)'
     
     def get_name(self) -> str:
         return 'stop_loss'
@@ -126,6 +330,7 @@ class StopLossStrategy(SellStrategy):
         """重置策略状态"""
         self.buy_date_idx = -1
         self.last_check_idx = -1
+        self._last_query_key = None
     
     def set_buy_info(self, buy_date_idx: int):
         """
@@ -136,12 +341,16 @@ class StopLossStrategy(SellStrategy):
         """
         self.buy_date_idx = buy_date_idx
         self.last_check_idx = buy_date_idx
+        self._last_query_key = None
 
 
 class TakeProfitStrategy(SellStrategy):
     """止盈策略：当盈利达到指定比例时卖出
     注意：使用日线数据进行检查，确保不会错过止盈点"""
     
+    KIND = STRATEGY_TAKE_PROFIT
+    __slots__ = ('take_profit_percent', 'buy_date_idx', 'last_check_idx', '_last_query_key')
+    
     def __init__(self, take_profit_percent: Optional[float]):
         """
         初始化止盈策略
@@ -152,33 +361,38 @@ class TakeProfitStrategy(SellStrategy):
         self.take_profit_percent = take_profit_percent
         self.buy_date_idx = -1  # 买入日期索引
         self.last_check_idx = -1  # 上次检查的日线索引
+        self._last_query_key = None  # 上次未触发卖出时的查询位置
     
-    def should_sell(self, context: Dict[str, Any]) -> Tuple[bool, str]:
-        if not context.get('position', False):
-            return False, ''
+    def should_sell(self, context: SellContext) -> Tuple[bool, str]:
+        if not context.position:
+            return _NO_SELL
         
         if self.take_profit_percent is None:
-            return False, ''
+            return _NO_SELL
         
-        buy_price = context.get('buy_price', 0)
-        # 优先使用 context 中的 buy_date_idx，如果没有则使用实例变量
-        buy_date_idx = context.get('buy_date_idx', self.buy_date_idx)
-        current_daily_idx = context.get('current_daily_idx', -1)
+        buy_price = context.buy_price
+        buy_date_idx = context.buy_date_idx
+        current_daily_idx = context.current_daily_idx
         
         if buy_price <= 0 or buy_date_idx < 0 or current_daily_idx < 0:
-            return False, ''
+            return _NO_SELL
         
-        daily_df = context.get('daily_df')
-        daily_closes = context.get('daily_closes')
+        daily_df = context.daily_df
+        daily_closes = context.daily_closes
         
         if daily_df is None or daily_closes is None:
             # 如果没有日线数据，使用周期数据检查（兼容性处理）
-            current_close = context.get('current_close', 0)
+            current_close = context.current_close
             if current_close > 0:
                 profit_percent = ((current_close - buy_price) / buy_price * 100)
                 if profit_percent >= self.take_profit_percent:
-                    return True, f'止盈({profit_percent:.2f}%)'
-            return False, ''
+                    return True, self.sell_reason(current_close, buy_price)
+            return _NO_SELL
+
+        # 同一持仓在同一日线位置已判断过且未触发时，状态已覆盖到该位置，直接返回
+        query_key = (buy_date_idx, current_daily_idx)
+        if query_key == self._last_query_key:
+            return _NO_SELL
         
         # 使用日线数据进行检查，从买入日期的下一天开始，到当前日期
         # 这样可以确保不会错过任何止盈点
@@ -188,33 +402,37 @@ class TakeProfitStrategy(SellStrategy):
         
         # 确保检查范围有效
         if check_start_idx > check_end_idx:
-            return False, ''
-        
-        # 预先获取数组长度，避免重复计算
-        daily_df_len = len(daily_df)
-        daily_closes_len = len(daily_closes)
-        
-        # 遍历从上次检查位置到当前日期的所有日线数据
-        for check_idx in range(check_start_idx, check_end_idx + 1):
-            if check_idx >= daily_df_len:
-                break
-            
-            daily_close = daily_closes[check_idx] if check_idx < daily_closes_len else None
-            
-            if pd.notna(daily_close) and daily_close > 0:
-                # 计算该日的盈亏比例
-                profit_percent = ((daily_close - buy_price) / buy_price * 100)
-                
-                # 如果盈利达到止盈比例，立即卖出
-                if profit_percent >= self.take_profit_percent:
-                    self.last_check_idx = check_idx
-                    return True, f'止盈({profit_percent:.2f}%)'
+            return _NO_SELL
+        
+        if NUMBA_AVAILABLE:
+            triggered, hit_close, self.last_check_idx = scan_profit_threshold(
+                daily_closes, float(buy_price), buy_date_idx, current_daily_idx, self.last_check_idx,
+                float(self.take_profit_percent), True)
+            if triggered:
+                return True, self.sell_reason(hit_close, buy_price)
+            self._last_query_key = query_key
+            return _NO_SELL
+        
+        # 一次性比较从上次检查位置到当前日期的所有日线数据（切片自动截断到数组末尾）
+        closes = daily_closes[check_start_idx:check_end_idx + 1]
+        profit_percents = (closes - buy_price) / buy_price * 100
+        triggered = (closes > 0) & (profit_percents >= self.take_profit_percent)
+        if triggered.any():
+            # 第一个盈利达到止盈比例的日期，立即卖出
+            hit = int(np.argmax(triggered))
+            self.last_check_idx = check_start_idx + hit
+            return True, self.sell_reason(closes[hit], buy_price)
         
         # 更新最后检查的索引
         if check_end_idx >= 0:
             self.last_check_idx = check_end_idx
         
-        return False, ''
+        self._last_query_key = query_key
+        return _NO_SELL
+    
+    def sell_reason(self, daily_close: float, buy_price: float) -> str:
+        """生成卖出原因（只在触发时调用），附带触发日收益"""
+        return f'止盈({(daily_close - buy_price) / buy_price * 100:.2f}%)'
     
     def get_name(self) -> str:
         return 'take_profit'
@@ -223,6 +441,7 @@ class TakeProfitStrategy(SellStrategy):
         """重置策略状态"""
         self.buy_date_idx = -1
         self.last_check_idx = -1
+        self._last_query_key = None
     
     def set_buy_info(self, buy_date_idx: int):
         """
@@ -233,12 +452,18 @@ class TakeProfitStrategy(SellStrategy):
         """
         self.buy_date_idx = buy_date_idx
         self.last_check_idx = buy_date_idx
+        self._last_query_key = None
 
 
 class BelowMa20Strategy(SellStrategy):
     """20均线下方策略：买入后上穿20均线，然后收盘价回落到20均线下方N天，第(N+1)天卖出
     新增：只有在收益达到指定阈值（如10%）以上时才触发此策略"""
     
+    KIND = STRATEGY_BELOW_MA20
+    __slots__ = ('below_ma20_days', 'min_profit_percent', 'buy_below_ma20', 'crossed_ma20', 'crossed_ma20_date_idx',
+                 'close_below_ma20_days', 'last_ma20_check_idx', 'buy_date_idx', 'profit_threshold_reached',
+                 '_last_query_key')
+    
     def __init__(self, below_ma20_days: int, min_profit_percent: Optional[float] = None):
         """
         初始化20均线下方策略
@@ -262,70 +487,78 @@ class BelowMa20Strategy(SellStrategy):
         self.last_ma20_check_idx = -1  # 上次检查20均线下方情况的日线索引
         self.buy_date_idx = -1  # 买入日期索引
         self.profit_threshold_reached = False  # 是否已经达到过收益阈值（用于min_profit_percent检查）
+        self._last_query_key = None  # 上次未触发卖出时的查询位置
     
-    def should_sell(self, context: Dict[str, Any]) -> Tuple[bool, str]:
-        if not context.get('position', False):
-            return False, ''
+    def should_sell(self, context: SellContext) -> Tuple[bool, str]:
+        if not context.position:
+            return _NO_SELL
         
         # 只有买入时收盘价在20均线下方，才启用此策略
         if not self.buy_below_ma20:
-            return False, ''
+            return _NO_SELL
         
-        # 优先使用 context 中的 buy_date_idx，如果没有则使用实例变量
-        buy_date_idx = context.get('buy_date_idx', self.buy_date_idx)
-        current_daily_idx = context.get('current_daily_idx', -1)
+        buy_date_idx = context.buy_date_idx
+        current_daily_idx = context.current_daily_idx
         
         if buy_date_idx < 0 or current_daily_idx < 0:
-            return False, ''
+            return _NO_SELL
         
-        daily_df = context.get('daily_df')
-        daily_closes = context.get('daily_closes')
-        daily_ma20 = context.get('daily_ma20')
+        daily_df = context.daily_df
+        daily_closes = context.daily_closes
+        daily_ma20 = context.daily_ma20
         
         if daily_df is None or daily_closes is None or daily_ma20 is None:
-            return False, ''
+            return _NO_SELL
+
+        # 同一持仓在同一日线位置已判断过且未触发时，状态已覆盖到该位置，直接返回
+        query_key = (buy_date_idx, current_daily_idx)
+        if query_key == self._last_query_key:
+            return _NO_SELL
+        
+        # 上下文中提供了预先计算的20均线数组时，直接查表（设置了收益阈值时计数方式不同，仍逐日检查）
+        ma20_cross_up_idx = context.daily_ma20_cross_up_idx
+        below_ma20_count = context.daily_below_ma20_count
+        if ma20_cross_up_idx is not None and below_ma20_count is not None and self.min_profit_percent is None:
+            sell, reason = self._should_sell_precomputed(buy_date_idx, current_daily_idx, daily_closes,
+                                                         ma20_cross_up_idx, below_ma20_count)
+            if not sell:
+                self._last_query_key = query_key
+            return sell, reason
+        
+        if NUMBA_AVAILABLE:
+            buy_price = context.buy_price
+            min_profit_percent = np.nan if self.min_profit_percent is None else float(self.min_profit_percent)
+            (triggered, hit_close, self.crossed_ma20, self.crossed_ma20_date_idx, self.close_below_ma20_days,
+             self.last_ma20_check_idx, self.profit_threshold_reached) = scan_below_ma20(
+                daily_closes, daily_ma20, float(buy_price), buy_date_idx, current_daily_idx, True,
+                self.crossed_ma20, self.crossed_ma20_date_idx, self.close_below_ma20_days,
+                self.last_ma20_check_idx, self.profit_threshold_reached, self.below_ma20_days, min_profit_percent)
+            if triggered:
+                return True, self.sell_reason(hit_close, buy_price)
+            self._last_query_key = query_key
+            return _NO_SELL
         
         # 第一步：检查是否上穿20均线（从买入日期之后开始检查）
         if not self.crossed_ma20:
             # 遍历从买入日期的下一天到当前日期的所有日线数据，检查是否有上穿动作
             # 上穿：前一日收盘价 <= 20均线，当前收盘价 > 20均线
             # 注意：需要从买入日期的下一天开始，因为买入当天已经在20均线下方
-            check_start_idx = buy_date_idx + 1  # 从买入日期的下一天开始检查
-            check_end_idx = current_daily_idx
-            
-            # 预先获取数组长度，避免重复计算
-            daily_df_len = len(daily_df)
-            daily_closes_len = len(daily_closes)
-            daily_ma20_len = len(daily_ma20)
+            # 前一日从买入日期当天开始（因为买入时已经在20均线下方），切片自动截断到数组末尾
+            closes = daily_closes[buy_date_idx:current_daily_idx + 1]
+            ma20 = daily_ma20[buy_date_idx:current_daily_idx + 1]
             
-            for check_idx in range(check_start_idx, check_end_idx + 1):
-                if check_idx < 1 or check_idx >= daily_df_len:
-                    continue
-                
-                # 获取当前和前一日的数据
-                prev_idx = check_idx - 1
-                # 前一日必须至少是买入日期当天（因为买入时已经在20均线下方）
-                if prev_idx < buy_date_idx:
-                    continue
-                
-                prev_close = daily_closes[prev_idx] if prev_idx < daily_closes_len else None
-                prev_ma20 = daily_ma20[prev_idx] if prev_idx < daily_ma20_len else None
-                curr_close = daily_closes[check_idx] if check_idx < daily_closes_len else None
-                curr_ma20 = daily_ma20[check_idx] if check_idx < daily_ma20_len else None
-                
-                # 检查是否上穿：前一日收盘价 <= 20均线，当前收盘价 > 20均线
-                if (pd.notna(prev_ma20) and pd.notna(prev_close) and 
-                    pd.notna(curr_ma20) and pd.notna(curr_close) and
-                    prev_close <= prev_ma20 and curr_close > curr_ma20):
-                    self.crossed_ma20 = True
-                    self.crossed_ma20_date_idx = check_idx
-                    self.close_below_ma20_days = 0
-                    self.last_ma20_check_idx = check_idx  # 初始化检查索引
-                    break  # 找到上穿后，停止检查
+            # 相邻两日一次性比较（NaN参与的比较均为False，即数据无效的日期不算上穿）
+            crossed = (closes[:-1] <= ma20[:-1]) & (closes[1:] > ma20[1:])
+            if crossed.any():
+                # 找到第一个上穿日期
+                self.crossed_ma20 = True
+                self.crossed_ma20_date_idx = buy_date_idx + 1 + int(np.argmax(crossed))
+                self.close_below_ma20_days = 0
+                self.last_ma20_check_idx = self.crossed_ma20_date_idx  # 初始化检查索引
         
         # 第二步：如果已上穿20均线，检查收盘价是否在20均线下方
         if self.crossed_ma20 and self.crossed_ma20_date_idx >= 0:
-            buy_price = context.get('buy_price', 0)
+            buy_price = context.buy_price
             
             # 从上穿日期的下一天开始，到当前日期，检查所有日线数据
             # 使用last_ma20_check_idx来避免重复检查，从上一次检查的位置之后开始
@@ -334,56 +567,96 @@ class BelowMa20Strategy(SellStrategy):
             
             # 确保检查范围有效
             if check_start_idx > check_end_idx:
-                return False, ''
+                return _NO_SELL
+            
+            # 从上一次检查的位置之后开始，到当前日期的日线数据（切片自动截断到数组末尾）
+            closes = daily_closes[check_start_idx:check_end_idx + 1]
+            ma20 = daily_ma20[check_start_idx:check_end_idx + 1]
             
-            # 预先获取数组长度，避免重复计算
-            daily_df_len = len(daily_df)
-            daily_closes_len = len(daily_closes)
-            daily_ma20_len = len(daily_ma20)
+            # 注意：只使用表格中的MA.MA3值，收盘价或20均线为NaN的日期跳过（不计数也不重置）
+            checked = ~np.isnan(closes) & ~np.isnan(ma20)
             
-            # 从上一次检查的位置之后开始，到当前日期，遍历所有日线数据
-            for check_idx in range(check_start_idx, check_end_idx + 1):
-                if check_idx >= daily_df_len:
-                    break
+            # 如果设置了最小收益阈值，只有在收益达到阈值后（后续即使暂时低于阈值也继续检查）才检查20均线
+            if self.min_profit_percent is not None and buy_price > 0:
+                profit_percents = (closes - buy_price) / buy_price * 100
+                reached = np.logical_or.accumulate(checked & (profit_percents >= self.min_profit_percent))
+                reached |= self.profit_threshold_reached
+                checked &= reached
+            else:
+                reached = None
+            
+            below = checked & (closes < ma20)
+            if len(closes) > 0:
+                # 连续天数 = 截至当日的下方天数累计 - 最近一次回到20均线上方时的累计（区间内未重置时接上之前的计数）
+                below_total = np.cumsum(below)
+                reset_idx = np.maximum.accumulate(np.where(checked & ~below, np.arange(len(closes)), -1))
+                below_days = np.where(reset_idx >= 0, below_total - below_total[np.maximum(reset_idx, 0)],
+                                      below_total + self.close_below_ma20_days)
                 
-                daily_close = daily_closes[check_idx] if check_idx < daily_closes_len else None
-                daily_ma20_val = daily_ma20[check_idx] if check_idx < daily_ma20_len else None
+                # 如果连续below_ma20_days天在20均线下方，第(below_ma20_days+1)天卖出
+                triggered = below & (below_days >= self.below_ma20_days)
+                end = int(np.argmax(triggered)) if triggered.any() else len(closes) - 1
+                self.close_below_ma20_days = int(below_days[end])
+                if reached is not None:
+                    self.profit_threshold_reached = bool(reached[end])
                 
-                # 注意：只使用表格中的MA.MA3值，如果值为NaN则跳过
-                if pd.notna(daily_ma20_val) and pd.notna(daily_close):
-                    # 如果设置了最小收益阈值，需要先检查收益是否达到阈值
-                    if self.min_profit_percent is not None and buy_price > 0:
-                        daily_profit_percent = ((daily_close - buy_price) / buy_price * 100)
-                        
-                        # 如果收益达到阈值，标记为已达到（后续即使暂时低于阈值也继续检查）
-                        if daily_profit_percent >= self.min_profit_percent:
-                            self.profit_threshold_reached = True
-                        
-                        # 只有在收益达到阈值后，才开始检查收盘价是否在20均线下方
-                        if not self.profit_threshold_reached:
-                            continue  # 收益未达到阈值，跳过检查
-                    
-                    # 检查收盘价是否在20均线下方
-                    if daily_close < daily_ma20_val:
-                        # 收盘价在20均线下方，累加计数
-                        self.close_below_ma20_days += 1
-                        
-                        # 如果连续below_ma20_days天在20均线下方，第(below_ma20_days+1)天卖出
-                        if self.close_below_ma20_days >= self.below_ma20_days:
-                            self.last_ma20_check_idx = check_idx  # 更新检查索引
-                            # 计算最终收益用于显示
-                            final_profit_percent = ((daily_close - buy_price) / buy_price * 100) if buy_price > 0 else 0
-                            profit_info = f'（收益{final_profit_percent:.2f}%）' if self.min_profit_percent is not None else ''
-                            return True, f'收盘价在20均线下方{self.below_ma20_days}天{profit_info}，第{self.below_ma20_days+1}天卖出'
-                    else:
-                        # 如果收盘价回到20均线上方，重置计数
-                        self.close_below_ma20_days = 0
+                if triggered[end]:
+                    self.last_ma20_check_idx = check_start_idx + end  # 更新检查索引
+                    return True, self.sell_reason(closes[end], buy_price)
             
             # 更新最后检查的索引（即使没有卖出，也要更新，避免重复检查）
             if check_end_idx >= 0:
                 self.last_ma20_check_idx = check_end_idx
         
-        return False, ''
+        self._last_query_key = query_key
+        return _NO_SELL
+    
+    def sell_reason(self, daily_close: float, buy_price: float) -> str:
+        """生成卖出原因（只在触发时调用），设置了收益阈值时附带触发日收益"""
+        # 计算最终收益用于显示
+        final_profit_percent = ((daily_close - buy_price) / buy_price * 100) if buy_price > 0 else 0
+        profit_info = f'（收益{final_profit_percent:.2f}%）' if self.min_profit_percent is not None else ''
+        return f'收盘价在20均线下方{self.below_ma20_days}天{profit_info}，第{self.below_ma20_days+1}天卖出'
+    
+    def _should_sell_precomputed(self, buy_date_idx: int, current_daily_idx: int, daily_closes,
+                                 ma20_cross_up_idx, below_ma20_count) -> Tuple[bool, str]:
+        """
+        使用预先计算的上穿日期索引和连续天数数组判断是否卖出（不设收益阈值时与逐日检查结果一致）
+        """
+        last_idx = len(below_ma20_count) - 1
+        
+        # 第一步：买入后第一个上穿20均线的日期
+        if not self.crossed_ma20:
+            check_start_idx = max(buy_date_idx + 1, 1)
+            check_end_idx = min(current_daily_idx, last_idx)
+            # 上穿日期索引升序排列，二分查找买入后第一个上穿日期，不再逐日扫描
+            pos = np.searchsorted(ma20_cross_up_idx, check_start_idx)
+            if pos < len(ma20_cross_up_idx) and ma20_cross_up_idx[pos] <= check_end_idx:
+                self.crossed_ma20 = True
+                self.crossed_ma20_date_idx = int(ma20_cross_up_idx[pos])
+                self.close_below_ma20_days = 0
+                self.last_ma20_check_idx = self.crossed_ma20_date_idx
+        
+        # 第二步：上穿后第一个连续天数达到below_ma20_days的日期
+        if self.crossed_ma20 and self.crossed_ma20_date_idx >= 0:
+            check_start_idx = max(self.crossed_ma20_date_idx + 1, self.last_ma20_check_idx + 1)
+            if check_start_idx > current_daily_idx:
+                return _NO_SELL
+            
+            counts = below_ma20_count[check_start_idx:min(current_daily_idx, last_idx) + 1]
+            triggered = np.flatnonzero(counts >= self.below_ma20_days)
+            if len(triggered) > 0:
+                self.close_below_ma20_days = int(counts[triggered[0]])
+                self.last_ma20_check_idx = check_start_idx + int(triggered[0])
+                return True, f'收盘价在20均线下方{self.below_ma20_days}天，第{self.below_ma20_days+1}天卖出'
+            
+            # 未触发：记录区间内最后一个有效日的连续天数（无效日为-1，不影响计数）
+            valid_counts = counts[counts >= 0]
+            if len(valid_counts) > 0:
+                self.close_below_ma20_days = int(valid_counts[-1])
+            self.last_ma20_check_idx = current_daily_idx
+        
+        return _NO_SELL
     
     def get_name(self) -> str:
         return 'below_ma20'
@@ -395,6 +668,7 @@ class BelowMa20Strategy(SellStrategy):
         self.close_below_ma20_days = 0
         self.last_ma20_check_idx = -1
         self.profit_threshold_reached = False
+        self._last_query_key = None
     
     def set_buy_info(self, buy_date_idx: int, buy_below_ma20: bool):
         """
@@ -414,6 +688,10 @@ class TrailingStopLossStrategy(SellStrategy):
     随着股价上升，止损点也随之上移，始终保持在最新高点下方相同幅度
     注意：使用日线数据进行检查，确保不会错过止损点"""
     
+    KIND = STRATEGY_TRAILING_STOP
+    __slots__ = ('trailing_stop_percent', 'highest_price', 'stop_loss_price', 'buy_date_idx', 'last_check_idx',
+                 '_last_query_key')
+    
     def __init__(self, trailing_stop_percent: float):
         """
         初始化追踪止损策略
@@ -429,24 +707,29 @@ class TrailingStopLossStrategy(SellStrategy):
         self.stop_loss_price = 0.0  # 当前止损价
         self.buy_date_idx = -1  # 买入日期索引
         self.last_check_idx = -1  # 上次检查的日线索引
+        self._last_query_key = None  # 上次未触发卖出时的查询位置
     
-    def should_sell(self, context: Dict[str, Any]) -> Tuple[bool, str]:
-        if not context.get('position', False):
-            return False, ''
+    def should_sell(self, context: SellContext) -> Tuple[bool, str]:
+        if not context.position:
+            return _NO_SELL
         
-        buy_price = context.get('buy_price', 0)
-        # 优先使用 context 中的 buy_date_idx，如果没有则使用实例变量
-        buy_date_idx = context.get('buy_date_idx', self.buy_date_idx)
-        current_daily_idx = context.get('current_daily_idx', -1)
+        buy_price = context.buy_price
+        buy_date_idx = context.buy_date_idx
+        current_daily_idx = context.current_daily_idx
         
         if buy_price <= 0 or buy_date_idx < 0 or current_daily_idx < 0:
-            return False, ''
+            return _NO_SELL
         
-        daily_df = context.get('daily_df')
-        daily_closes = context.get('daily_closes')
+        daily_df = context.daily_df
+        daily_closes = context.daily_closes
         
         if daily_df is None or daily_closes is None:
-            return False, ''
+            return _NO_SELL
+
+        # 同一持仓在同一日线位置已判断过且未触发时，状态已覆盖到该位置，直接返回
+        query_key = (buy_date_idx, current_daily_idx)
+        if query_key == self._last_query_key:
+            return _NO_SELL
         
         # 使用日线数据进行检查，从买入日期的下一天开始，到当前日期
         # 确保 last_check_idx 有效，如果为 -1 则从买入日期下一天开始
@@ -455,37 +738,53 @@ class TrailingStopLossStrategy(SellStrategy):
         
         # 确保检查范围有效
         if check_start_idx > check_end_idx:
-            return False, ''
-        
-        # 预先获取数组长度，避免重复计算
-        daily_df_len = len(daily_df)
-        daily_closes_len = len(daily_closes)
-        
-        # 遍历从上次检查位置到当前日期的所有日线数据
-        for check_idx in range(check_start_idx, check_end_idx + 1):
-            if check_idx >= daily_df_len:
-                break
+            return _NO_SELL
+        
+        if NUMBA_AVAILABLE:
+            (triggered, hit_close, self.last_check_idx, self.highest_price,
+             self.stop_loss_price) = scan_trailing_stop(
+                daily_closes, float(buy_price), buy_date_idx, current_daily_idx, self.last_check_idx,
+                float(self.highest_price), float(self.stop_loss_price), float(self.trailing_stop_percent))
+            if triggered:
+                return True, self.sell_reason(hit_close, buy_price)
+            self._last_query_key = query_key
+            return _NO_SELL
+        
+        # 从上次检查位置到当前日期的日线数据（切片自动截断到数组末尾）
+        closes = daily_closes[check_start_idx:check_end_idx + 1]
+        valid = closes > 0
+        if valid.any():
+            # 以当前最高价为起点一次性计算逐日最高价（无效收盘价不参与），止损价始终在最高价下方trailing_stop_percent%
+            highest_prices = np.maximum.accumulate(np.where(valid, closes, -np.inf))
+            np.maximum(highest_prices, self.highest_price, out=highest_prices)
+            stop_loss_prices = highest_prices * (1 - self.trailing_stop_percent / 100)
             
-            daily_close = daily_closes[check_idx] if check_idx < daily_closes_len else None
+            # 如果收盘价跌破当日止损价，则卖出
+            triggered = valid & (closes < stop_loss_prices)
+            if triggered.any():
+                hit = int(np.argmax(triggered))
+                self._update_highest_price(highest_prices[hit])
+                self.last_check_idx = check_start_idx + hit
+                return True, self.sell_reason(closes[hit], buy_price)
             
-            if pd.notna(daily_close) and daily_close > 0:
-                # 更新最高价
-                if daily_close > self.highest_price:
-                    self.highest_price = daily_close
-                    # 计算新的止损价：最高价下方trailing_stop_percent%
-                    self.stop_loss_price = self.highest_price * (1 - self.trailing_stop_percent / 100)
-                
-                # 如果当前收盘价跌破止损价，则卖出
-                if daily_close < self.stop_loss_price:
-                    profit_percent = ((daily_close - buy_price) / buy_price * 100)
-                    self.last_check_idx = check_idx
-                    return True, f'追踪止损({profit_percent:.2f}%)'
+            self._update_highest_price(highest_prices[-1])
         
         # 更新最后检查的索引（即使没有触发止损，也要更新以避免重复检查）
         if check_end_idx >= 0:
             self.last_check_idx = check_end_idx
         
-        return False, ''
+        self._last_query_key = query_key
+        return _NO_SELL
+    
+    def _update_highest_price(self, highest_price: float):
+        """最高价上升时同步上移止损价"""
+        if highest_price > self.highest_price:
+            self.highest_price = float(highest_price)
+            self.stop_loss_price = self.highest_price * (1 - self.trailing_stop_percent / 100)
+    
+    def sell_reason(self, daily_close: float, buy_price: float) -> str:
+        """生成卖出原因（只在触发时调用），附带触发日收益"""
+        return f'追踪止损({(daily_close - buy_price) / buy_price * 100:.2f}%)'
     
     def get_name(self) -> str:
         return 'trailing_stop_loss'
@@ -496,6 +795,7 @@ class TrailingStopLossStrategy(SellStrategy):
         self.stop_loss_price = 0.0
         self.buy_date_idx = -1
         self.last_check_idx = -1
+        self._last_query_key = None
     
     def set_buy_info(self, buy_price: float, buy_date_idx: int = -1):
         """
@@ -511,30 +811,65 @@ class TrailingStopLossStrategy(SellStrategy):
         self.highest_price = buy_price
         self.buy_date_idx = buy_date_idx
         self.last_check_idx = buy_date_idx if buy_date_idx >= 0 else -1
+        self._last_query_key = None
         # 初始止损价：买入价下方trailing_stop_percent%
         self.stop_loss_price = buy_price * (1 - self.trailing_stop_percent / 100)
 
 
+def precompute_ma20_signals(daily_closes, daily_ma20) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    一次性计算20均线相关的日线数组，供BelowMa20Strategy直接查表
+    
+    Args:
+        daily_closes: 日线收盘价数组
+        daily_ma20: 日线20均线数组
+    
+    Returns:
+        (上穿日期索引数组, 连续天数数组)
+        - 上穿日期索引：前一日收盘价<=20均线且当日收盘价>20均线（两日数据均有效）的日期，升序排列
+        - 连续天数：截至当日收盘价连续在20均线下方的天数，收盘价或20均线为NaN的日期记为-1且不中断计数
+    """
+    closes = np.asarray(daily_closes, dtype=np.float64)
+    ma20 = np.asarray(daily_ma20, dtype=np.float64)
+    valid = ~np.isnan(closes) & ~np.isnan(ma20)
+    
+    cross_up = np.zeros(len(closes), dtype=bool)
+    cross_up[1:] = valid[:-1] & valid[1:] & (closes[:-1] <= ma20[:-1]) & (closes[1:] > ma20[1:])
+    
+    # 连续天数 = 截至当日的下方天数累计 - 最近一次有效且不在下方的日期的累计值
+    below = valid & (closes < ma20)
+    below_total = np.cumsum(below)
+    reset_idx = np.maximum.accumulate(np.where(valid & ~below, np.arange(len(closes)), -1))
+    below_count = below_total - np.where(reset_idx >= 0, below_total[np.maximum(reset_idx, 0)], 0)
+    below_count[~valid] = -1
+    
+    # 上穿日期只保留索引，策略内二分查找；连续天数使用int32存储，内存占用减半
+    return np.flatnonzero(cross_up), below_count.astype(np.int32)
+
+
+# 策略名称 -> (策略类, 从工厂参数中提取构造参数的函数)，模块加载时构建一次
+_STRATEGY_REGISTRY = {
+    'stop_loss': (StopLossStrategy, lambda kwargs: (kwargs.get('stop_loss_percent', 5.0),)),
+    'take_profit': (TakeProfitStrategy, lambda kwargs: (kwargs.get('take_profit_percent'),)),
+    'below_ma20': (BelowMa20Strategy,
+                   lambda kwargs: (kwargs.get('below_ma20_days', 3), kwargs.get('below_ma20_min_profit', None))),
+    'trailing_stop_loss': (TrailingStopLossStrategy, lambda kwargs: (kwargs.get('trailing_stop_percent', 5.0),)),
+}
+
+
 def create_strategy(strategy_name: str, **kwargs) -> Optional[SellStrategy]:
     """
     工厂方法：创建卖出策略实例
     
     Args:
-        strategy_name: 策略名称
+        strategy_name: 策略名称（见_STRATEGY_REGISTRY）
         **kwargs: 策略参数
     
     Returns:
         策略实例，如果策略名称无效则返回None
     """
-    strategies = {
-        'stop_loss': lambda: StopLossStrategy(kwargs.get('stop_loss_percent', 5.0)),
-        'take_profit': lambda: TakeProfitStrategy(kwargs.get('take_profit_percent')),
-        'below_ma20': lambda: BelowMa20Strategy(kwargs.get('below_ma20_days', 3), kwargs.get('below_ma20_min_profit', None)),
-        'trailing_stop_loss': lambda: TrailingStopLossStrategy(kwargs.get('trailing_stop_percent', 5.0))
-    }
-    
-    strategy_factory = strategies.get(strategy_name)
-    if strategy_factory:
-        return strategy_factory()
-    return None
-
+    entry = _STRATEGY_REGISTRY.get(strategy_name)
+    if entry is None:
+        return None
+    strategy_class, extract_args = entry
+    return strategy_class(*extract_args(kwargs))
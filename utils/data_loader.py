@@ -3,8 +3,34 @@
 负责从Excel文件加载股票数据
 """
 
+import importlib.util
+import re
 import pandas as pd
 
+# python-calamine（Rust实现的Excel解析，可选）：安装后优先使用calamine引擎读取Excel，比openpyxl快数倍
+CALAMINE_AVAILABLE = importlib.util.find_spec('python_calamine') is not None
+
+# 列名行的识别关键词
+_HEADER_PATTERN = re.compile('时间|开盘|日期')
+
+# 标准列名及其识别关键词（按顺序匹配，列名包含任一关键词即视为匹配）
+_COLUMN_KEYWORDS = [
+    ('date', ['时间', '日期', 'date', 'Date', 'time', 'Time', '交易日期']),
+    ('open', ['开盘', 'open', 'Open', '开盘价']),
+    ('high', ['最高', 'high', 'High', '最高价']),
+    ('low', ['最低', 'low', 'Low', '最低价']),
+    ('close', ['收盘', 'close', 'Close', '收盘价', '价格', 'price']),
+    ('volume', ['成交量', 'volume', 'Volume', '成交额', 'amount']),
+    # 趋势线列（如果Excel中已有），保留原始趋势线列
+    ('趋势线_原始', ['趋势线', 'trend', 'Trend', '超买超卖', '超买超卖.趋势线']),
+    # MA.MA3列（20日均线），使用表格中的MA.MA3作为20日均线
+    ('ma20', ['MA.MA3', 'MA3', 'ma3', '20日均线', 'MA20']),
+]
+
+# 每个标准列的关键词预编译为一个正则表达式
+_COLUMN_PATTERNS = [(std_name, re.compile('|'.join(map(re.escape, keywords))))
+                    for std_name, keywords in _COLUMN_KEYWORDS]
+
 
 def load_stock_data(file_path: str) -> pd.DataFrame:
     """
@@ -17,13 +43,12 @@ def load_stock_data(file_path: str) -> pd.DataFrame:
         包含股票数据的DataFrame
     """
     # 先读取原始数据，不设置header
-    df_raw = pd.read_excel(file_path, header=None)
+    df_raw = _read_excel_raw(file_path)
     
-    # 查找列名行（通常包含"时间"、"开盘"等关键词）
+    # 查找列名行（通常包含"时间"、"开盘"等关键词）：前10行一次取出为数组，逐行拼接后用正则匹配
     header_row = None
-    for i in range(min(10, len(df_raw))):
-        row_str = ' '.join([str(x) for x in df_raw.iloc[i].tolist() if pd.notna(x)])
-        if '时间' in row_str or '开盘' in row_str or '日期' in row_str:
+    for i, row in enumerate(df_raw.head(10).to_numpy(dtype=object)):
+        if _HEADER_PATTERN.search(' '.join([str(x) for x in row if pd.notna(x)])):
             header_row = i
             break
     
@@ -31,95 +56,37 @@ def load_stock_data(file_path: str) -> pd.DataFrame:
         # 如果找不到列名行，尝试使用第2行（常见格式）
         header_row = 2
     
-    # 读取数据，使用找到的列名行作为header
-    df = pd.read_excel(file_path, header=header_row)
+    # 使用找到的列名行作为header（在已读取的数据上处理，不再重复解析Excel文件）
+    df = _promote_header_row(df_raw, header_row)
     
-    # 删除空行
+    # 删除空行（索引在最后删除不完整数据后统一重置）
     df = df.dropna(how='all')
     
-    # 重置索引
-    df = df.reset_index(drop=True)
-    
-    # 尝试自动识别列名（常见的中文和英文列名）
+    # 尝试自动识别列名（常见的中文和英文列名）：每个标准列取第一个匹配的列
     column_mapping = {}
-    
-    # 日期列 - 检查所有列
-    date_keywords = ['时间', '日期', 'date', 'Date', 'time', 'Time', '交易日期']
-    for col in df.columns:
-        col_str = str(col).strip()
-        if any(keyword in col_str for keyword in date_keywords):
-            column_mapping[col] = 'date'
-            break
-    
-    # 开盘价
-    open_keywords = ['开盘', 'open', 'Open', '开盘价']
-    for col in df.columns:
-        col_str = str(col).strip()
-        if any(keyword in col_str for keyword in open_keywords):
-            column_mapping[col] = 'open'
-            break
-    
-    # 最高价
-    high_keywords = ['最高', 'high', 'High', '最高价']
-    for col in df.columns:
-        col_str = str(col).strip()
-        if any(keyword in col_str for keyword in high_keywords):
-            column_mapping[col] = 'high'
-            break
-    
-    # 最低价
-    low_keywords = ['最低', 'low', 'Low', '最低价']
-    for col in df.columns:
-        col_str = str(col).strip()
-        if any(keyword in col_str for keyword in low_keywords):
-            column_mapping[col] = 'low'
-            break
-    
-    # 收盘价
-    close_keywords = ['收盘', 'close', 'Close', '收盘价', '价格', 'price']
-    for col in df.columns:
-        col_str = str(col).strip()
-        if any(keyword in col_str for keyword in close_keywords):
-            column_mapping[col] = 'close'
-            break
-    
-    # 成交量
-    volume_keywords = ['成交量', 'volume', 'Volume', '成交额', 'amount']
+    unmatched = list(_COLUMN_PATTERNS)
     for col in df.columns:
-        col_str = str(col).strip()
-        if any(keyword in col_str for keyword in volume_keywords):
-            column_mapping[col] = 'volume'
+        if not unmatched:
             break
-    
-    # 趋势线列（如果Excel中已有）
-    trend_line_keywords = ['趋势线', 'trend', 'Trend', '超买超卖', '超买超卖.趋势线']
-    for col in df.columns:
-        col_str = str(col).strip()
-        if any(keyword in col_str for keyword in trend_line_keywords):
-            column_mapping[col] = '趋势线_原始'  # 保留原始趋势线列
-            break
-    
-    # MA.MA3列（20日均线）- 从表格中读取
-    ma3_keywords = ['MA.MA3', 'MA3', 'ma3', '20日均线', 'MA20']
-    for col in df.columns:
         col_str = str(col).strip()
-        if any(keyword in col_str for keyword in ma3_keywords):
-            column_mapping[col] = 'ma20'  # 使用表格中的MA.MA3作为20日均线
-            break
+        for item in list(unmatched):
+            std_name, pattern = item
+            if pattern.search(col_str):
+                # 同一列匹配多个标准列时，以靠后的标准列为准
+                column_mapping[col] = std_name
+                unmatched.remove(item)
     
     # 重命名列
     df = df.rename(columns=column_mapping)
     
     # 如果列名映射失败，尝试按位置映射（常见格式：时间、开盘、最高、最低、收盘）
     if 'open' not in df.columns and len(df.columns) >= 5:
-        # 假设标准格式：第0列=时间，第1列=开盘，第2列=最高，第3列=最低，第4列=收盘
-        df.columns.values[0] = 'date'
-        df.columns.values[1] = 'open'
-        df.columns.values[2] = 'high'
-        df.columns.values[3] = 'low'
-        df.columns.values[4] = 'close'
-        if len(df.columns) >= 6:
-            df.columns.values[5] = 'volume'
+        # 假设标准格式：第0列=时间，第1列=开盘，第2列=最高，第3列=最低，第4列=收盘，第5列=成交量（如果有）
+        # 整体替换列名（直接修改df.columns.values会使列索引的查找缓存失效）
+        positional_names = ['date', 'open', 'high', 'low', 'close', 'volume']
+        new_columns = list(df.columns)
+        new_columns[:len(positional_names)] = positional_names[:len(new_columns)]
+        df.columns = new_columns
     
     # 确保必需的列存在
     required_cols = ['open', 'high', 'low', 'close']
@@ -155,3 +122,60 @@ def load_stock_data(file_path: str) -> pd.DataFrame:
 
 
 
+
+
+def _read_excel_raw(file_path: str) -> pd.DataFrame:
+    """
+    不设置header读取Excel文件：安装python-calamine时使用calamine引擎，否则使用默认的openpyxl
+    
+    Args:
+        file_path: Excel文件路径
+        
+    Returns:
+        原始数据DataFrame
+    """
+    if CALAMINE_AVAILABLE:
+        try:
+            return pd.read_excel(file_path, header=None, engine='calamine')
+        except (ValueError, ImportError):
+            # pandas版本过低（<2.2）不支持calamine引擎时，改用默认引擎读取
+            pass
+    return pd.read_excel(file_path, header=None)
+
+
+def _promote_header_row(df_raw: pd.DataFrame, header_row: int) -> pd.DataFrame:
+    """
+    将原始数据的第header_row行作为列名，返回其后的数据行
+    
+    列名和数据与pd.read_excel(file_path, header=header_row)一致：空列名记为"Unnamed: 列号"，
+    重复列名依次加后缀".1"、".2"，各列重新推断数据类型（索引沿用原始行号，由调用方统一重置）
+    
+    Args:
+        df_raw: 不带header读取的原始数据
+        header_row: 列名所在行
+        
+    Returns:
+        以header_row行为列名的DataFrame
+    """
+    if header_row >= len(df_raw):
+        return df_raw.iloc[0:0]
+    
+    columns = []
+    name_counts = {}
+    for i, name in enumerate(df_raw.iloc[header_row].tolist()):
+        if pd.isna(name):
+            name = f'Unnamed: {i}'
+        if name in name_counts:
+            count = name_counts[name]
+            deduped = f'{name}.{count + 1}'
+            while deduped in name_counts:
+                count += 1
+                deduped = f'{name}.{count + 1}'
+            name_counts[name] = count + 1
+            name = deduped
+        name_counts[name] = 0
+        columns.append(name)
+    
+    df = df_raw.iloc[header_row + 1:]
+    df.columns = columns
+    return df.infer_objects()
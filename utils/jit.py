@@ -0,0 +1,23 @@
+"""
+JIT编译工具
+封装numba的njit装饰器，未安装numba时退化为普通Python函数
+"""
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # pragma: no cover - 取决于运行环境
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """
+        numba.njit的空实现：直接返回原函数
+
+        同时支持 @njit 和 @njit(cache=True) 两种写法
+        """
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
@@ -4,6 +4,7 @@
 """
 
 import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
 
 
 def convert_to_period(df: pd.DataFrame, period: str = 'D') -> pd.DataFrame:
@@ -18,18 +19,19 @@ def convert_to_period(df: pd.DataFrame, period: str = 'D') -> pd.DataFrame:
         转换后的DataFrame
     """
     if period == 'D':
-        return df.copy()
+        # 浅拷贝即可：对返回值新增或替换列不会影响传入的df
+        return df.copy(deep=False)
     
     # 确保date列是datetime类型
     if 'date' not in df.columns:
         raise ValueError("数据必须包含'date'列")
     
-    df = df.copy()
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date').reset_index(drop=True)
-    
-    # 设置date为索引以便进行resample
-    df_indexed = df.set_index('date')
+    if not is_datetime64_any_dtype(df['date']):
+        # assign返回新的DataFrame，只替换date列，其他列不复制
+        df = df.assign(date=pd.to_datetime(df['date']))
+    if not df['date'].is_monotonic_increasing:
+        # 按日期排序（聚合时只按date列分组，无需重建索引）
+        df = df.sort_values('date')
     
     if period == 'W':
         # 周线：按照自然周（周一到周日）计算
@@ -38,19 +40,8 @@ def convert_to_period(df: pd.DataFrame, period: str = 'D') -> pd.DataFrame:
         # 最高：自然周内最高价
         # 最低：自然周内最低价
         # 成交量：自然周内成交量之和
-        # 使用 'W-SUN' 表示周一到周日（周日作为周结束标签）
-        weekly = pd.DataFrame()
-        weekly['open'] = df_indexed['open'].resample('W-SUN', label='right', closed='right').first()
-        weekly['close'] = df_indexed['close'].resample('W-SUN', label='right', closed='right').last()
-        weekly['high'] = df_indexed['high'].resample('W-SUN', label='right', closed='right').max()
-        weekly['low'] = df_indexed['low'].resample('W-SUN', label='right', closed='right').min()
-        if 'volume' in df_indexed.columns:
-            weekly['volume'] = df_indexed['volume'].resample('W-SUN', label='right', closed='right').sum()
-        # 日期使用自然周的结束日期（周日）
-        weekly['date'] = weekly.index
-        weekly = weekly.reset_index(drop=True)
-        result = weekly
-        
+        # 使用 'W-SUN' 表示周一到周日（周日作为周结束标签），日期使用自然周的结束日期（周日）
+        rule = 'W-SUN'
     elif period == 'M':
         # 月线：按照自然月（1号到月末）计算
         # 开盘：自然月内第一个交易日的开盘价
@@ -58,22 +49,22 @@ def convert_to_period(df: pd.DataFrame, period: str = 'D') -> pd.DataFrame:
         # 最高：自然月内最高价
         # 最低：自然月内最低价
         # 成交量：自然月内成交量之和
-        # 使用 'ME' 表示自然月末（月末最后一天作为标签）
-        monthly = pd.DataFrame()
-        monthly['open'] = df_indexed['open'].resample('ME', label='right', closed='right').first()
-        monthly['close'] = df_indexed['close'].resample('ME', label='right', closed='right').last()
-        monthly['high'] = df_indexed['high'].resample('ME', label='right', closed='right').max()
-        monthly['low'] = df_indexed['low'].resample('ME', label='right', closed='right').min()
-        if 'volume' in df_indexed.columns:
-            monthly['volume'] = df_indexed['volume'].resample('ME', label='right', closed='right').sum()
-        # 日期使用自然月的结束日期（月末最后一天）
-        monthly['date'] = monthly.index
-        monthly = monthly.reset_index(drop=True)
-        result = monthly
+        # 使用 'ME' 表示自然月末，日期使用自然月的结束日期（月末最后一天）
+        rule = 'ME'
     else:
         raise ValueError(f"不支持的周期类型: {period}，支持的类型: 'D'(日线), 'W'(周线), 'M'(月线)")
     
-    return result
+    # 按date列分组（无需先设置索引），只建立一次分组，各列在同一次分组上聚合
+    # （没有交易日的周期同样保留，价格为NaN，成交量为0）
+    aggregations = {'open': 'first', 'close': 'last', 'high': 'max', 'low': 'min'}
+    if 'volume' in df.columns:
+        aggregations['volume'] = 'sum'
+    aggregated = df[['date', *aggregations]].resample(rule, on='date', label='right', closed='right').agg(aggregations)
+    
+    # 由各列数组一次性构造结果（日期为周期的结束日期）
+    data = {col: aggregated[col].to_numpy() for col in aggregations}
+    data['date'] = aggregated.index.to_numpy()
+    return pd.DataFrame(data)
 
 
 